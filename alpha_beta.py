@@ -1,63 +1,166 @@
-from copy import deepcopy
-import pygame
-
 from constants import WHITE, RED
+from quiescence import quiescence
+from tablebase import score as tablebase_score
+from transposition import EXACT, LOWER, UPPER
 
 
-def alpha_beta(position, depth, alpha, beta, to_max, game):
+def alpha_beta(position, depth, alpha, beta, to_max, color, context=None):
+    # color is the side the engine plays against; the engine maximises.
+    # A repeated position inside the tree, or one past the no-progress
+    # limit, is a draw.
+    if context is not None and context.ply and position.is_drawn():
+        return 0, None
+    if depth == 0 and context is not None and context.quiescence:
+        return quiescence(position, alpha, beta, to_max, color, context), None
+    if context is not None:
+        context.visit()
+    ai_color = RED if color == WHITE else WHITE
     if depth == 0 or position.winner() is not None:
-        return position.evaluate(), position
+        if __debug__:
+            if context is not None and context.stats is not None:
+                context.stats.leaves += 1
+        return position.evaluate(ai_color), None
+
+    if context is not None and context.tablebase is not None and context.ply \
+            and context.tablebase.covers(position.bitboard):
+        side = ai_color if to_max else color
+        result = context.tablebase.probe(position.bitboard, side)
+        if result is not None:
+            return tablebase_score(result, side == ai_color, context.ply), None
+
+    alpha_orig, beta_orig = alpha, beta
+    tt = context.tt if context is not None else None
+    hint = None
+    if context is not None:
+        key = position.key(ai_color if to_max else color)
+        hint = context.pv.get(key)
+    if tt is not None:
+        entry = tt.probe(key)
+        if __debug__:
+            if context.stats is not None:
+                context.stats.probe(entry)
+        if entry is not None:
+            if hint is None:
+                hint = entry[3]
+            if entry[0] >= depth:
+                if entry[1] == EXACT:
+                    return entry[2], entry[3]
+                if entry[1] == LOWER:
+                    alpha = max(alpha, entry[2])
+                else:
+                    beta = min(beta, entry[2])
+                if beta <= alpha:
+                    return entry[2], entry[3]
+
+    ordering = context.ordering if context is not None else None
+    # principal variation search: null windows for every child after the first
+    pvs = context is not None and context.pvs
     if to_max:
         max_eval = float('-inf')
         best_move = None
-        for move in get_all_moves(position, WHITE, game):
-            evaluation = alpha_beta(move, depth - 1, alpha, beta, False, game)[0]
+        for index, move in enumerate(get_all_moves(position, ai_color, hint, context, depth)):
+            record = position.make_move(move)
+            if context is not None:
+                context.ply += 1
+            if index and pvs and alpha != float('-inf'):
+                # later brothers only have to prove they are no better; with
+                # alpha still infinite (a lost first move) there is no null
+                # window around it, so the full window is searched
+                evaluation = alpha_beta(position, depth - 1, alpha, alpha + 1, False, color, context)[0]
+                if alpha < evaluation < beta:
+                    evaluation = alpha_beta(position, depth - 1, alpha, beta, False, color, context)[0]
+            else:
+                evaluation = alpha_beta(position, depth - 1, alpha, beta, False, color, context)[0]
+            if context is not None:
+                context.ply -= 1
+            position.unmake_move(record)
             max_eval = max(max_eval, evaluation)
             alpha = max(alpha, evaluation)
             if max_eval == evaluation:
                 best_move = move
             if beta <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(move, context.ply, depth, index)
+                if __debug__:
+                    if context is not None and context.stats is not None:
+                        context.stats.cutoff(index)
                 break
+        if tt is not None:
+            store(tt, key, depth, max_eval, best_move, alpha_orig, beta_orig)
         return max_eval, best_move
     else:
         min_eval = float('inf')
         best_move = None
-        for move in get_all_moves(position, RED, game):
-            evaluation = alpha_beta(move, depth - 1, alpha, beta, True, game)[0]
+        for index, move in enumerate(get_all_moves(position, color, hint, context, depth)):
+            record = position.make_move(move)
+            if context is not None:
+                context.ply += 1
+            if index and pvs and beta != float('inf'):
+                evaluation = alpha_beta(position, depth - 1, beta - 1, beta, True, color, context)[0]
+                if alpha < evaluation < beta:
+                    evaluation = alpha_beta(position, depth - 1, alpha, beta, True, color, context)[0]
+            else:
+                evaluation = alpha_beta(position, depth - 1, alpha, beta, True, color, context)[0]
+            if context is not None:
+                context.ply -= 1
+            position.unmake_move(record)
             min_eval = min(min_eval, evaluation)
             beta = min(beta, evaluation)
             if min_eval == evaluation:
                 best_move = move
             if beta <= alpha:
+                if ordering is not None:
+                    ordering.cutoff(move, context.ply, depth, index)
+                if __debug__:
+                    if context is not None and context.stats is not None:
+                        context.stats.cutoff(index)
                 break
+        if tt is not None:
+            store(tt, key, depth, min_eval, best_move, alpha_orig, beta_orig)
         return min_eval, best_move
 
 
-def simulate_move(piece, move, board, game, skip):
-    board.move(piece, move[0], move[1])
-    if skip:
-        board.remove(skip)
-
-    return board
-
+def store(tt, key, depth, value, move, alpha, beta):
+    if value <= alpha:
+        flag = UPPER
+    elif value >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    tt.store(key, depth, flag, value, move)
 
-def get_all_moves(board, color, game):
-    moves = []
 
-    for piece in board.get_all_pieces(color):
-        valid_moves = board.get_valid_moves(piece)
-        for move, skip in valid_moves.items():
-            draw_moves(game, board, piece)
-            temp_board = deepcopy(board)
-            temp_piece = temp_board.get_piece(piece.row, piece.col)
-            new_board = simulate_move(temp_piece, move, temp_board, game, skip)
-            moves.append(new_board)
-    return moves
+def get_all_moves(board, color, first=None, context=None, depth=None):
+    # Yields moves in stages, so a cutoff skips the stages not yet reached:
+    # a quiet hint is checked and tried before any other move is generated,
+    # then the captures (only these when one exists) or the quiet moves.
+    bits = board.bitboard
+    captures = bits.has_captures(color)
+    tried = None
+    if first is not None and not captures and bits.is_quiet_move(color, first):
+        tried = first
+        if context is not None and context.debug_hook is not None:
+            context.debug_hook(board, first)
+        yield first
 
-def draw_moves(game, board, piece):
-    valid_moves = board.get_valid_moves(piece)
-    board.draw(game.win)
-    pygame.draw.circle(game.win, (0,255,0), (piece.x, piece.y), 50, 5)
-    game.draw_valid_moves(valid_moves.keys())
-    pygame.display.update()
-    #pygame.time.delay(100)
+    if context is not None and depth is not None:
+        moves = context.buffers[depth]
+        moves.clear()
+    else:
+        moves = []
+    if captures:
+        bits.get_captures(color, moves)
+    else:
+        bits.get_quiet_moves(color, moves)
+    if tried is not None:
+        moves.remove(tried)
+        first = None
+    if context is not None and context.ordering is not None:
+        context.ordering.order(moves, context.ply, first)
+    elif first is not None and first in moves:
+        moves.remove(first)
+        moves.insert(0, first)
+    for move in moves:
+        if context is not None and context.debug_hook is not None:
+            context.debug_hook(board, move)
+        yield move
@@ -0,0 +1,79 @@
+import argparse
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bitboard import SQUARES, squares
+from evaluation import DEFAULT_EVALUATION
+from constants import WHITE, RED
+
+# A position is encoded as four 32-bit masks:
+#   white men, white kings, red men, red kings
+# and a batch as an (N, 4) uint32 array of them.
+LAYERS = 4
+
+
+def encode(bits):
+    return (bits.white & ~bits.kings, bits.white & bits.kings,
+            bits.red & ~bits.kings, bits.red & bits.kings)
+
+
+def encode_boards(boards):
+    rows = [encode(board.bitboard) for board in boards]
+    if np is None:
+        return rows
+    return np.array(rows, dtype=np.uint32).reshape(-1, LAYERS)
+
+
+def layer_tables(evaluation):
+    # signed piece-square values per layer, white's point of view
+    white_men, white_kings = evaluation.tables[WHITE]
+    red_men, red_kings = evaluation.tables[RED]
+    return (list(white_men), list(white_kings),
+            [-value for value in red_men], [-value for value in red_kings])
+
+
+def evaluate_batch_scalar(encoded, evaluation=DEFAULT_EVALUATION):
+    tables = layer_tables(evaluation)
+    scores = []
+    for row in encoded:
+        total = 0
+        for layer in range(LAYERS):
+            table = tables[layer]
+            for sq in squares(int(row[layer])):
+                total += table[sq]
+        scores.append(total)
+    return scores
+
+
+def evaluate_batch(encoded, evaluation=DEFAULT_EVALUATION):
+    # Scores every row of the batch from white's point of view in one
+    # vectorised pass: unpack the masks into a 0/1 matrix of shape
+    # (N, 4 * 32) and multiply by the flattened piece-square tables.
+    if np is None:
+        return evaluate_batch_scalar(encoded, evaluation)
+    encoded = np.ascontiguousarray(encoded, dtype='<u4').reshape(-1, LAYERS)
+    bits = np.unpackbits(encoded.view(np.uint8), axis=1, bitorder='little')
+    weights = np.array(layer_tables(evaluation), dtype=np.int64).reshape(LAYERS * SQUARES)
+    return bits.astype(np.int64) @ weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score an (N, 4) uint32 .npy file of encoded positions')
+    parser.add_argument('positions')
+    parser.add_argument('scores')
+    parser.add_argument('--verify', action='store_true', help='compare against the scalar path')
+    args = parser.parse_args()
+    if np is None:
+        parser.error('numpy is required to read .npy files')
+    encoded = np.load(args.positions)
+    scores = evaluate_batch(encoded)
+    if args.verify and list(scores) != evaluate_batch_scalar(encoded):
+        raise SystemExit('batch and scalar scores differ')
+    np.save(args.scores, scores)
+
+
+if __name__ == '__main__':
+    main()
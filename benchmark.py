@@ -0,0 +1,234 @@
+import argparse
+import cProfile
+import json
+import operator
+import pstats
+import sys
+import tracemalloc
+
+from bitboard import opponent, move_name
+from position import Position
+from search import iterative_deepening
+from search_bench import SUITE as MIDDLEGAMES
+from transposition import TranspositionTable
+
+# Regression benchmark: every suite position is searched by every mode to a
+# fixed depth (nodes, time to each depth, nodes/second, chosen move), once
+# more under tracemalloc for the peak memory of the search, and once with a
+# fixed time per move (depth reached, nodes/second). The totals are compared
+# against a saved baseline.
+
+# few-piece positions, mostly kings, for flying-king generation and endgame
+# search; the first five are small enough for the tablebase, which is left
+# out so the search itself is measured
+ENDGAMES = (
+    'W:WK30:RK3',
+    'W:WK21,K25:RK4,K8',
+    'W:WK18,22:RK5',
+    'W:W21,K9:R12,K28',
+    'R:W20,K31:R13,K2',
+    'W:WK1,K32,26:RK15,K19',
+    'R:WK14,24,27:RK2,K7,11',
+    'W:W22,23,K6:R9,10,K27',
+)
+SUITE = tuple(('middlegame', fen) for fen in MIDDLEGAMES) + tuple(('endgame', fen) for fen in ENDGAMES)
+
+# iterative_deepening options for each mode; 'engine' is what main.py plays
+MODES = {
+    'minimax': {'use_minimax': True},
+    'alpha_beta': {},
+    'pvs': {'pvs': True},
+    'pvs+aspiration': {'pvs': True, 'aspiration': 50},
+    'engine': {'pvs': True, 'aspiration': 50, 'quiescence': True},
+}
+
+DEPTH = 7
+# minimax has no pruning, so it stops earlier to keep the suite quick
+MINIMAX_DEPTH = 5
+MOVETIME = 0.2
+ROUNDS = 3
+TT_SIZE_MB = 16
+BASELINE = 'bench_baseline.json'
+# allowed slowdown in nodes/second and time to depth
+TOLERANCE = 0.15
+# allowed growth in nodes at fixed depth, and in peak memory
+NODE_TOLERANCE = 0.02
+MEMORY_TOLERANCE = 0.25
+
+
+def mode_depth(mode, depth):
+    return min(depth, MINIMAX_DEPTH) if MODES[mode].get('use_minimax') else depth
+
+
+def search(fen, mode, **limits):
+    # fresh table each run, so runs do not depend on each other
+    position = Position.from_fen(fen)
+    iterations = []
+    result = iterative_deepening(position.to_board(), opponent(position.color), tt=TranspositionTable(TT_SIZE_MB),
+                                 progress=iterations.append, **dict(MODES[mode], **limits))
+    return result, iterations
+
+
+def peak_memory(fen, mode, depth):
+    # bytes allocated at the peak of the search; the table is allocated
+    # before tracing starts, so its fixed size is not counted
+    position = Position.from_fen(fen)
+    board = position.to_board()
+    tt = TranspositionTable(TT_SIZE_MB)
+    tracemalloc.start()
+    try:
+        iterative_deepening(board, opponent(position.color), max_depth=depth, tt=tt, **MODES[mode])
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def nps(nodes, seconds):
+    return nodes / seconds if seconds else 0.0
+
+
+def totals(positions, movetime, memory):
+    nodes = sum(entry['nodes'] for entry in positions)
+    seconds = sum(entry['seconds'] for entry in positions)
+    timed_nodes = sum(entry['timed']['nodes'] for entry in positions)
+    return {
+        'nodes': nodes, 'seconds': seconds, 'nps': nps(nodes, seconds),
+        'peak_bytes': max(entry['peak_bytes'] for entry in positions) if memory else None,
+        'timed_depth': sum(entry['timed']['depth'] for entry in positions) / len(positions),
+        'timed_nps': nps(timed_nodes, movetime * len(positions)),
+    }
+
+
+def run(depth=DEPTH, movetime=MOVETIME, modes=tuple(MODES), rounds=ROUNDS, memory=True):
+    report = {'depth': depth, 'movetime': movetime, 'modes': {}}
+    for mode in modes:
+        positions = []
+        for phase, fen in SUITE:
+            # the fastest of a few rounds; the node counts are the same each time
+            best = None
+            for _ in range(rounds):
+                result, iterations = search(fen, mode, max_depth=mode_depth(mode, depth))
+                if best is None or result.elapsed < best[0].elapsed:
+                    best = result, iterations
+            result, iterations = best
+            timed, _ = search(fen, mode, time_limit=movetime)
+            positions.append({
+                'phase': phase, 'fen': fen, 'nodes': result.nodes, 'seconds': result.elapsed,
+                'nps': nps(result.nodes, result.elapsed),
+                'time_to_depth': [iteration.elapsed for iteration in iterations],
+                'peak_bytes': peak_memory(fen, mode, mode_depth(mode, depth)) if memory else None,
+                'move': move_name(result.move) if result.move else None, 'value': result.value,
+                'timed': {'depth': timed.depth, 'nodes': timed.nodes, 'nps': nps(timed.nodes, timed.elapsed),
+                          'move': move_name(timed.move) if timed.move else None},
+            })
+        summary = dict(totals(positions, movetime, memory), depth=mode_depth(mode, depth))
+        # per phase as well, so an endgame regression is not hidden by the
+        # larger middlegame totals
+        summary['phases'] = {phase: totals([entry for entry in positions if entry['phase'] == phase], movetime,
+                                           memory)
+                             for phase in sorted({phase for phase, fen in SUITE})}
+        summary['positions'] = positions
+        report['modes'][mode] = summary
+    return report
+
+
+def compare(report, baseline, tolerance=TOLERANCE, node_tolerance=NODE_TOLERANCE,
+            memory_tolerance=MEMORY_TOLERANCE, out=sys.stdout):
+    # Prints every regression against the baseline and returns their count.
+    # Changed moves at fixed depth are listed but do not count: they follow
+    # from any change to the search or the evaluation.
+    if baseline['depth'] != report['depth']:
+        print('baseline was recorded at depth {}, not {}'.format(baseline['depth'], report['depth']), file=out)
+        return 1
+    regressions = 0
+
+    def check(mode, name, value, limit, worse):
+        nonlocal regressions
+        if value is not None and limit is not None and worse(value, limit):
+            print('REGRESSION {}: {} {:.2f} against a limit of {:.2f}'.format(mode, name, value, limit), file=out)
+            regressions += 1
+
+    for mode, summary in report['modes'].items():
+        base = baseline['modes'].get(mode)
+        if base is None:
+            continue
+        for phase, values in summary['phases'].items():
+            old = base['phases'].get(phase)
+            if old is None:
+                continue
+            name = '{} {}'.format(mode, phase)
+            check(name, 'nodes', values['nodes'], old['nodes'] * (1 + node_tolerance), operator.gt)
+            check(name, 'seconds to depth', values['seconds'], old['seconds'] * (1 + tolerance), operator.gt)
+            check(name, 'nodes/s', values['nps'], old['nps'] * (1 - tolerance), operator.lt)
+            check(name, 'timed nodes/s', values['timed_nps'], old['timed_nps'] * (1 - tolerance), operator.lt)
+            if values['peak_bytes'] is not None and old['peak_bytes'] is not None:
+                check(name, 'peak bytes', values['peak_bytes'], old['peak_bytes'] * (1 + memory_tolerance),
+                      operator.gt)
+        moves = {entry['fen']: entry['move'] for entry in base['positions']}
+        for entry in summary['positions']:
+            if entry['fen'] in moves and entry['move'] != moves[entry['fen']]:
+                print('{} {}: move {} (baseline {})'.format(mode, entry['fen'], entry['move'], moves[entry['fen']]),
+                      file=out)
+    return regressions
+
+
+def profile(report, path, top=20):
+    # Profiles the slowest position/mode pair again and saves the stats for
+    # pstats, snakeviz or flameprof.
+    mode, entry = max(((mode, entry) for mode, summary in report['modes'].items() for entry in summary['positions']),
+                      key=lambda pair: pair[1]['seconds'])
+    print('profiling {} on {}'.format(mode, entry['fen']))
+    profiler = cProfile.Profile()
+    profiler.runcall(search, entry['fen'], mode, max_depth=mode_depth(mode, report['depth']))
+    profiler.dump_stats(path)
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search regression benchmark')
+    parser.add_argument('--depth', type=int, default=DEPTH)
+    parser.add_argument('--movetime', type=float, default=MOVETIME, help='seconds per position for timed runs')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--rounds', type=int, default=ROUNDS, help='fixed-depth runs per position, fastest kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    parser.add_argument('--out', help='write the full report here as JSON')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed slowdown in nodes/s and time to depth')
+    parser.add_argument('--node-tolerance', type=float, default=NODE_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument('--profile', help='profile the slowest position and save the stats here')
+    args = parser.parse_args()
+
+    report = run(args.depth, args.movetime, args.modes, args.rounds, not args.no_memory)
+    print('{:<16} {:<10} {:>5} {:>10} {:>8} {:>10} {:>9} {:>7} {:>10}'.format(
+        'mode', 'phase', 'depth', 'nodes', 'seconds', 'nodes/s', 'peak KiB', 'timed', 'timed n/s'))
+    for mode, summary in report['modes'].items():
+        for phase, values in sorted(summary['phases'].items(), reverse=True):
+            peak = '{:.0f}'.format(values['peak_bytes'] / 1024) if values['peak_bytes'] is not None else '-'
+            print('{:<16} {:<10} {:>5} {:>10} {:>8.2f} {:>10.0f} {:>9} {:>7.1f} {:>10.0f}'.format(
+                mode, phase, summary['depth'], values['nodes'], values['seconds'], values['nps'], peak,
+                values['timed_depth'], values['timed_nps']))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.profile:
+        profile(report, args.profile)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        return 0
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        return 0
+    regressions = compare(report, baseline, args.tolerance, args.node_tolerance, args.memory_tolerance)
+    print('{} regressions against {}'.format(regressions, args.baseline))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
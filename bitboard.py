@@ -0,0 +1,273 @@
+from constants import ROWS, COLS, RED, WHITE
+
+# The 32 dark squares are numbered row by row, four per row:
+#   row 0 -> cols 1, 3, 5, 7 (squares 0..3)
+#   row 1 -> cols 0, 2, 4, 6 (squares 4..7) ...
+SQUARES = 32
+FULL = (1 << SQUARES) - 1
+
+EVEN_ROWS = 0
+for _row in range(0, ROWS, 2):
+    EVEN_ROWS |= 0xF << (_row * 4)
+ODD_ROWS = FULL ^ EVEN_ROWS
+# col 0 only exists on odd rows, col 7 only on even rows
+LEFT_EDGE = ODD_ROWS & 0x11111111
+RIGHT_EDGE = EVEN_ROWS & 0x88888888
+
+TOP_ROW = 0xF
+BOTTOM_ROW = 0xF << ((ROWS - 1) * 4)
+
+WHITE_START = FULL & ~((1 << 20) - 1)
+RED_START = (1 << 12) - 1
+
+# white starts at the bottom and moves up, red starts at the top and moves down
+PROMOTION = {WHITE: TOP_ROW, RED: BOTTOM_ROW}
+
+
+def square(row, col):
+    return row * 4 + col // 2
+
+
+def row_col(sq):
+    row = sq // 4
+    return row, (sq % 4) * 2 + (1 - row % 2)
+
+
+def is_dark(row, col):
+    return 0 <= row < ROWS and 0 <= col < COLS and col % 2 == (row + 1) % 2
+
+
+def squares(bb):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def up_left(bb):
+    return ((bb & EVEN_ROWS) >> 4) | ((bb & ODD_ROWS & ~LEFT_EDGE) >> 5)
+
+
+def up_right(bb):
+    return ((bb & EVEN_ROWS & ~RIGHT_EDGE) >> 3) | ((bb & ODD_ROWS) >> 4)
+
+
+def down_left(bb):
+    return (((bb & EVEN_ROWS) << 4) | ((bb & ODD_ROWS & ~LEFT_EDGE) << 3)) & FULL
+
+
+def down_right(bb):
+    return (((bb & EVEN_ROWS & ~RIGHT_EDGE) << 5) | ((bb & ODD_ROWS) << 4)) & FULL
+
+
+STEPS = (up_left, up_right, down_left, down_right)
+OPPOSITE = {up_left: down_right, up_right: down_left, down_left: up_right, down_right: up_left}
+FORWARD = {WHITE: (up_left, up_right), RED: (down_left, down_right)}
+
+
+# Tables built once at import, indexed by square:
+#   RAYS[sq]  -> one tuple per direction of (bit, square) pairs along the diagonal
+#   JUMPS[sq] -> (jumped bit, landing bit, landing square) for each direction
+#                where a two-square jump stays on the board
+RAYS = []
+JUMPS = []
+for _sq in range(SQUARES):
+    _rays = []
+    _jumps = []
+    for _step in STEPS:
+        _ray = []
+        _bit = _step(1 << _sq)
+        while _bit:
+            _ray.append((_bit, _bit.bit_length() - 1))
+            _bit = _step(_bit)
+        if _ray:
+            _rays.append(tuple(_ray))
+        if len(_ray) > 1:
+            _jumps.append((_ray[0][0], _ray[1][0], _ray[1][1]))
+    RAYS.append(tuple(_rays))
+    JUMPS.append(tuple(_jumps))
+
+
+def opponent(color):
+    return RED if color == WHITE else WHITE
+
+
+class Bitboard:
+    # A move is a tuple (src, dst, captured_mask, promotes).
+    __slots__ = ('white', 'red', 'kings')
+
+    def __init__(self, white=WHITE_START, red=RED_START, kings=0):
+        self.white = white
+        self.red = red
+        self.kings = kings
+
+    def copy(self):
+        return Bitboard(self.white, self.red, self.kings)
+
+    def pieces(self, color):
+        return self.white if color == WHITE else self.red
+
+    def empty(self):
+        return FULL & ~(self.white | self.red)
+
+    def color_at(self, sq):
+        bit = 1 << sq
+        if self.white & bit:
+            return WHITE
+        if self.red & bit:
+            return RED
+        return None
+
+    def is_king(self, sq):
+        return bool(self.kings & (1 << sq))
+
+    def get_moves(self, color, moves=None):
+        # Pass a list to have it cleared and refilled instead of allocating
+        # a new one.
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+        self.get_captures(color, moves)
+        if moves:
+            return moves
+        return self.get_quiet_moves(color, moves)
+
+    def get_quiet_moves(self, color, moves=None):
+        if moves is None:
+            moves = []
+        own = self.pieces(color)
+        empty = self.empty()
+        promotion = PROMOTION[color]
+
+        men = own & ~self.kings
+        for step in FORWARD[color]:
+            back = OPPOSITE[step]
+            for dst in squares(step(men) & empty):
+                src = back(1 << dst).bit_length() - 1
+                moves.append((src, dst, 0, bool((1 << dst) & promotion)))
+
+        for src in squares(own & self.kings):
+            for ray in RAYS[src]:
+                for bit, dst in ray:
+                    if not bit & empty:
+                        break
+                    moves.append((src, dst, 0, False))
+        return moves
+
+    def is_quiet_move(self, color, move):
+        # Whether move is a legal non-capture here, assuming color has no
+        # capture; checks a remembered move without generating the others.
+        src, dst, captured, promotes = move
+        sbit, dbit = 1 << src, 1 << dst
+        if captured or not self.pieces(color) & sbit or not self.empty() & dbit:
+            return False
+        if self.kings & sbit:
+            if promotes:
+                return False
+            empty = self.empty()
+            for ray in RAYS[src]:
+                for bit, sq in ray:
+                    if bit == dbit:
+                        return True
+                    if not bit & empty:
+                        break
+            return False
+        if promotes != bool(dbit & PROMOTION[color]):
+            return False
+        return any(step(sbit) == dbit for step in FORWARD[color])
+
+    def has_captures(self, color):
+        own = self.pieces(color)
+        opp = self.pieces(opponent(color))
+        empty = self.empty()
+        men = own & ~self.kings
+        for step in STEPS:
+            if step(step(men) & opp) & empty:
+                return True
+        for src in squares(own & self.kings):
+            for ray in RAYS[src]:
+                for index, (bit, dst) in enumerate(ray):
+                    if not bit & empty:
+                        if bit & opp and index + 1 < len(ray) and ray[index + 1][0] & empty:
+                            return True
+                        break
+        return False
+
+    def get_captures(self, color, moves=None):
+        if moves is None:
+            moves = []
+        if not self.has_captures(color):
+            return moves
+        start = len(moves)
+        own = self.pieces(color)
+        opp = self.pieces(opponent(color))
+        empty = self.empty()
+        for src in squares(own):
+            bit = 1 << src
+            # the moving piece leaves its square, so it may pass over it again
+            self._jumps(src, src, opp, empty | bit, 0, bool(self.kings & bit), False, color, moves)
+        # only the sequences taking the most pieces may be played
+        most = max(captured.bit_count() for src, dst, captured, promotes in moves[start:])
+        moves[start:] = [move for move in moves[start:] if move[2].bit_count() == most]
+        return moves
+
+    def _jumps(self, src, sq, opp, empty, captured, king, promoted, color, moves):
+        # Captured pieces stay on the board until the sequence ends, so they
+        # block further jumps over or onto them.
+        found = False
+        if king:
+            for ray in RAYS[sq]:
+                index, length = 0, len(ray)
+                while index < length and ray[index][0] & empty:
+                    index += 1
+                if index + 1 >= length:
+                    continue
+                jumped = ray[index][0]
+                if not jumped & opp or jumped & captured:
+                    continue
+                index += 1
+                while index < length and ray[index][0] & empty:
+                    found = True
+                    self._jumps(src, ray[index][1], opp, empty, captured | jumped, True, promoted, color, moves)
+                    index += 1
+        else:
+            for jumped, land, land_sq in JUMPS[sq]:
+                if jumped & opp and not jumped & captured and land & empty:
+                    found = True
+                    # a man reaching the last row mid-capture carries on as a king
+                    crowned = bool(land & PROMOTION[color])
+                    self._jumps(src, land_sq, opp, empty, captured | jumped, crowned, crowned, color, moves)
+
+        if not found and captured:
+            move = (src, sq, captured, promoted)
+            if move not in moves:
+                moves.append(move)
+
+    def apply(self, color, move):
+        src, dst, captured, promotes = move
+        sbit, dbit = 1 << src, 1 << dst
+        if color == WHITE:
+            self.white = (self.white & ~sbit) | dbit
+            self.red &= ~captured
+        else:
+            self.red = (self.red & ~sbit) | dbit
+            self.white &= ~captured
+        was_king = self.kings & sbit
+        self.kings &= ~(captured | sbit)
+        if was_king or promotes:
+            self.kings |= dbit
+
+
+def square_name(sq):
+    row, col = row_col(sq)
+    return 'abcdefgh'[col] + str(ROWS - row)
+
+
+def parse_square(name):
+    return square(ROWS - int(name[1:]), 'abcdefgh'.index(name[0]))
+
+
+def move_name(move):
+    src, dst, captured, promotes = move
+    return square_name(src) + (':' if captured else '-') + square_name(dst)
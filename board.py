@@ -1,65 +1,144 @@
-import pygame
-from constants import BLACK, ROWS, RED, SQUARE_SIZE, COLS, WHITE, GREY
+from constants import RED, WHITE, COLOR_NAMES
 from piece import Piece
+from bitboard import Bitboard, square, row_col, is_dark, squares, opponent
+from zobrist import SIDE, piece_keys, hash_bitboard
+from evaluation import DEFAULT_EVALUATION
+
+REPETITIONS = 3
+# a draw after this many plies with neither a capture nor a man moving
+NO_PROGRESS_PLIES = 30
 
 
 class Board:
-    def __init__(self):
-        self.board = []
+    def __init__(self, evaluation=DEFAULT_EVALUATION):
+        self.bitboard = Bitboard()
         self.red_left = self.white_left = 12
         self.red_kings = self.white_kings = 0
-        self.create_board()
-
-    def draw_squares(self, win):
-        win.fill(BLACK)
-        for row in range(ROWS):
-            for col in range(row % 2, COLS, 2):
-                pygame.draw.rect(win, (255, 255, 255), (row * SQUARE_SIZE, col * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
-    def move(self, piece, row, col):
-        self.board[piece.row][piece.col], self.board[row][col] = self.board[row][col], self.board[piece.row][piece.col]
-        piece.move(row, col)
-
-        if row == ROWS - 1 and piece.color == WHITE:
-            piece.make_king()
-            self.white_kings += 1
-        elif row == 0 and piece.color == RED:
-            piece.make_king()
-            self.red_kings += 1
+        self.hash = hash_bitboard(self.bitboard)
+        self.evaluation = evaluation
+        # white's point of view, kept up to date by every change to the pieces
+        self.score = evaluation.score(self.bitboard)
+        # hash before each move made, and plies since the last capture or
+        # man move; only positions inside that window can repeat
+        self.history = []
+        self.quiet_plies = 0
+
+    def set_evaluation(self, evaluation):
+        self.evaluation = evaluation
+        self.score = evaluation.score(self.bitboard)
+
+    def set_masks(self, white, red, kings):
+        self.bitboard = Bitboard(white, red, kings)
+        self.white_left, self.red_left = white.bit_count(), red.bit_count()
+        self.white_kings, self.red_kings = (white & kings).bit_count(), (red & kings).bit_count()
+        self.hash = hash_bitboard(self.bitboard)
+        self.score = self.evaluation.score(self.bitboard)
+        self.history = []
+        self.quiet_plies = 0
+
+    def set_history(self, history, quiet_plies):
+        # history as returned by recent_history() of the board this one
+        # continues from
+        self.history = list(history)
+        self.quiet_plies = quiet_plies
+
+    def recent_history(self):
+        # the part of the history that can still be repeated
+        return self.history[len(self.history) - self.quiet_plies:] if self.quiet_plies else []
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.bitboard = self.bitboard.copy()
+        board.red_left, board.white_left = self.red_left, self.white_left
+        board.red_kings, board.white_kings = self.red_kings, self.white_kings
+        board.hash = self.hash
+        board.evaluation = self.evaluation
+        board.score = self.score
+        board.history = self.history[:]
+        board.quiet_plies = self.quiet_plies
+        return board
+
+    def make_move(self, move):
+        src, dst, captured, promotes = move
+        bits = self.bitboard
+        color = bits.color_at(src)
+        captured_kings = captured & bits.kings
+        was_king = bool(bits.kings & (1 << src))
+        record = (move, color, captured_kings, self.red_left, self.white_left, self.red_kings, self.white_kings,
+                  self.hash, self.score, self.quiet_plies)
+        self.history.append(self.hash)
+        self.quiet_plies = self.quiet_plies + 1 if was_king and not captured else 0
+        bits.apply(color, move)
+
+        key = self.hash ^ piece_keys(color, was_king)[src] ^ piece_keys(color, was_king or promotes)[dst]
+        table = self.evaluation.tables[color]
+        delta = table[was_king or promotes][dst] - table[was_king][src]
+        if captured:
+            enemy = opponent(color)
+            enemy_table = self.evaluation.tables[enemy]
+            for sq in squares(captured):
+                king = captured_kings >> sq & 1
+                key ^= piece_keys(enemy, king)[sq]
+                delta += enemy_table[king][sq]
+        self.hash = key
+        self.score += delta if color == WHITE else -delta
+
+        taken = captured.bit_count()
+        taken_kings = captured_kings.bit_count()
+        if color == WHITE:
+            self.red_left -= taken
+            self.red_kings -= taken_kings
+            if promotes:
+                self.white_kings += 1
+        else:
+            self.white_left -= taken
+            self.white_kings -= taken_kings
+            if promotes:
+                self.red_kings += 1
+        return record
+
+    def unmake_move(self, record):
+        (src, dst, captured, promotes), color, captured_kings, self.red_left, self.white_left, \
+            self.red_kings, self.white_kings, self.hash, self.score, self.quiet_plies = record
+        self.history.pop()
+        bits = self.bitboard
+        sbit, dbit = 1 << src, 1 << dst
+        if color == WHITE:
+            bits.white = (bits.white & ~dbit) | sbit
+            bits.red |= captured
+        else:
+            bits.red = (bits.red & ~dbit) | sbit
+            bits.white |= captured
+        was_king = bits.kings & dbit and not promotes
+        bits.kings &= ~dbit
+        if was_king:
+            bits.kings |= sbit
+        bits.kings |= captured_kings
+
+    def key(self, color):
+        return self.hash ^ SIDE[color]
+
+    def get_moves(self, color, moves=None):
+        return self.bitboard.get_moves(color, moves)
+
+    def get_move(self, piece, row, col):
+        src, dst = square(piece.row, piece.col), square(row, col)
+        for move in self.bitboard.get_moves(piece.color):
+            if move[0] == src and move[1] == dst:
+                return move
+        return None
 
     def get_piece(self, row, col):
-        return self.board[row][col]
-
-    def create_board(self):
-        for row in range(ROWS):
-            self.board.append([])
-            for col in range(COLS):
-                if col % 2 == ((row + 1) % 2):
-                    if row < 3:
-                        self.board[row].append(Piece(row, col, RED))
-                    elif row > 4:
-                        self.board[row].append(Piece(row, col, WHITE))
-                    else:
-                        self.board[row].append(0)
-                else:
-                    self.board[row].append(0)
-
-    def draw(self, win):
-        self.draw_squares(win)
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board[row][col]
-                if piece != 0:
-                    piece.draw(win)
-
-    def remove(self, pieces):
-        for piece in pieces:
-            self.board[piece.row][piece.col] = 0
-            if piece != 0:
-                if piece.color == RED:
-                    self.red_left -= 1
-                else:
-                    self.white_left -= 1
+        if not is_dark(row, col):
+            return 0
+        sq = square(row, col)
+        color = self.bitboard.color_at(sq)
+        if color is None:
+            return 0
+        piece = Piece(row, col, color)
+        if self.bitboard.is_king(sq):
+            piece.make_king()
+        return piece
 
     def winner(self):
         if self.red_left <= 0:
@@ -69,255 +148,48 @@ class Board:
 
         return None
 
-    def is_in_board(self, row, col):
-        if 0 <= row < ROWS and 0 <= col < ROWS:
-            return True
-        else:
-            return False
-
-    def is_free(self, row, col):
-        return self.board[row][col] == 0
-
-    def up_left_move(self, row, col):
-        moves = {}
-        if self.is_in_board(row - 1, col - 1) and self.is_free(row - 1, col - 1):
-            moves[(row - 1, col - 1)] = []
-        return moves
-
-    def up_right_move(self, row, col):
-        moves = {}
-        if self.is_in_board(row - 1, col + 1) and self.is_free(row - 1, col + 1):
-            moves[(row - 1, col + 1)] = []
-        return moves
-
-    def down_left_move(self, row, col):
-        moves = {}
-        if self.is_in_board(row + 1, col - 1) and self.is_free(row + 1, col - 1):
-            moves[(row + 1, col - 1)] = []
-        return moves
-
-    def down_right_move(self, row, col):
-        moves = {}
-        if self.is_in_board(row + 1, col + 1) and self.is_free(row + 1, col + 1):
-            moves[(row + 1, col + 1)] = []
-        return moves
-
-    ## QUEEN MOVES
-    def queen_up_left(self, row, col, piece, shift_possible=False):
-        moves = {}
-        if self.up_left_move(row, col) and not shift_possible:
-            moves.update(self.up_left_move(row, col))
-            moves.update(self.queen_up_left(row - 1, col - 1, piece))
-
-        elif not self.is_in_board(row - 1, col - 1):
-            return moves
-        elif self.board[row][col].color != piece.color:
-            moves = {**moves,
-                     **self.up_left_jump(row, col, piece, moves),
-                     **self.queen_up_left(row - 2, col - 2, piece, shift_possible=shift_possible),
-                     **self.queen_up_right(row - 2, col - 2, piece, shift_possible=not shift_possible),
-                     **self.queen_down_left(row - 2, col - 2, piece, shift_possible=not shift_possible),
-                     **self.queen_down_right(row - 2, col - 2, piece, shift_possible=not shift_possible)
-                     }
-
-        return moves
-
-    def queen_up_right(self, row, col, piece, shift_possible=False):
-        moves = {}
-        if self.up_left_move(row, col) and not shift_possible:
-            moves.update(self.up_left_move(row, col))
-            moves.update(self.queen_up_left(row - 1, col + 1, piece))
-
-        elif not self.is_in_board(row - 1, col + 1):
-            return moves
-        elif self.board[row][col].color != piece.color:
-            moves = {**moves,
-                     **self.up_left_jump(row, col, piece, moves),
-                     **self.queen_up_left(row - 2, col + 2, piece, shift_possible=not shift_possible),
-                     **self.queen_up_right(row - 2, col + 2, piece, shift_possible=shift_possible),
-                     **self.queen_down_left(row - 2, col + 2, piece, shift_possible=not shift_possible),
-                     **self.queen_down_right(row - 2, col + 2, piece, shift_possible=not shift_possible)
-                     }
-
-        return moves
-
-    def queen_down_left(self, row, col, piece, shift_possible=False):
-        moves = {}
-        if self.up_left_move(row, col) and not shift_possible:
-            moves.update(self.up_left_move(row, col))
-            moves.update(self.queen_up_left(row + 1, col - 1, piece))
-
-        elif not self.is_in_board(row + 1, col - 1):
-            return moves
-        elif self.board[row][col].color != piece.color:
-            moves = {**moves,
-                     **self.up_left_jump(row, col, piece, moves),
-                     **self.queen_up_left(row + 2, col - 2, piece, shift_possible=not shift_possible),
-                     **self.queen_up_right(row + 2, col - 2, piece, shift_possible=not shift_possible),
-                     **self.queen_down_left(row + 2, col - 2, piece, shift_possible=shift_possible),
-                     **self.queen_down_right(row + 2, col - 2, piece, shift_possible=not shift_possible)
-                     }
-
-        return moves
-
-    def queen_down_right(self, row, col, piece, shift_possible=False):
-        moves = {}
-        if self.up_left_move(row, col) and not shift_possible:
-            moves.update(self.up_left_move(row, col))
-            moves.update(self.queen_up_left(row + 1, col + 1, piece))
-
-        elif not self.is_in_board(row + 1, col + 1):
-            return moves
-        elif self.board[row][col].color != piece.color:
-            moves = {**moves,
-                     **self.up_left_jump(row, col, piece, moves),
-                     **self.queen_up_left(row + 2, col + 2, piece, shift_possible=not shift_possible),
-                     **self.queen_up_right(row + 2, col + 2, piece, shift_possible=not shift_possible),
-                     **self.queen_down_left(row + 2, col + 2, piece, shift_possible=not shift_possible),
-                     **self.queen_down_right(row + 2, col + 2, piece, shift_possible=shift_possible)
-                     }
-
-        return moves
-
-    def up_left_jump(self, row, col, piece, moves: dict):
-        if self.is_in_board(row - 2, col - 2)\
-                and self.is_in_board(row - 1, col - 1)\
-                and not self.is_free(row - 1, col - 1) \
-                and self.is_free(row - 2, col - 2) \
-                and piece.color != self.board[row - 1][col - 1].color:
-            val = moves.get((row, col), [])
-            val.append(self.get_piece(row - 1, col - 1))
-            moves[(row - 2, col - 2)] = val
-            if row == 0 and not piece.king:
-                piece.king = True
-                return {**moves,
-                        **self.queen_down_left(row, col, piece, True),
-                        **self.queen_down_right(row, col, piece, True)}
-            if piece.king:
-                return moves
-            moves = {**moves,
-                     **self.up_left_jump(row - 2, col - 2, piece, moves),
-                     **self.up_right_jump(row - 2, col - 2, piece, moves),
-                     **self.down_left_jump(row - 2, col - 2, piece, moves)}
-
-        return moves
-
-    def up_right_jump(self, row, col, piece, moves: dict):
-        if self.is_in_board(row - 2, col + 2)\
-                and self.is_in_board(row - 1, col + 1)\
-                and not self.is_free(row - 1, col + 1) \
-                and self.is_free(row - 2, col + 2) \
-                and piece.color != self.board[row - 1][col + 1].color:
-            val = moves.get((row, col), [])
-            val.append(self.get_piece(row - 1, col + 1))
-            moves[(row - 2, col + 2)] = val
-            if row == 0 and not piece.king:
-                piece.king = True
-                return {**moves,
-                        **self.queen_down_left(row, col, piece, True),
-                        **self.queen_down_right(row, col, piece, True)}
-            if piece.king:
-                return moves
-            moves = {**moves,
-                     **self.up_left_jump(row - 2, col + 2, piece, moves),
-                     **self.up_right_jump(row - 2, col + 2, piece, moves),
-                     **self.down_right_jump(row - 2, col + 2, piece, moves)}
-
-        return moves
-
-    def down_left_jump(self, row, col, piece, moves: dict):
-        if self.is_in_board(row + 2, col - 2) \
-                and self.is_in_board(row + 1, col - 1) \
-                and not self.is_free(row + 1, col - 1) \
-                and self.is_free(row + 2, col - 2) \
-                and piece.color != self.board[row + 1][col - 1].color:
-
-            val = moves.get((row, col), [])
-            val.append(self.get_piece(row + 1, col - 1))
-            moves[(row + 2, col - 2)] = val
-            if row == 7 and not piece.king:
-                piece.king = True
-                return {**moves,
-                        **self.queen_up_left(row, col, piece, True),
-                        **self.queen_up_right(row, col, piece, True)}
-            if piece.king:
-                return moves
-            moves = {**moves,
-                     **self.up_left_jump(row + 2, col - 2, piece, moves),
-                     **self.down_right_jump(row + 2, col - 2, piece, moves),
-                     **self.down_left_jump(row + 2, col - 2, piece, moves)}
-
-        return moves
-
-    def down_right_jump(self, row, col, piece, moves: dict):
-        if self.is_in_board(row + 2, col + 2)\
-                and self.is_in_board(row + 1, col + 1)\
-                and not self.is_free(row + 1, col + 1) \
-                and self.is_free(row + 2, col + 2) \
-                and piece.color != self.board[row + 1][col + 1].color:
-            val = moves.get((row, col), [])
-            val.append(self.get_piece(row + 1, col + 1))
-            moves[(row + 2, col + 2)] = val
-            if piece.king:
-                return moves
-            if row == 7 and not piece.king:
-                piece.king = True
-                return {**moves,
-                        **self.queen_up_left(row, col, piece, True),
-                        **self.queen_up_right(row, col, piece, True)}
-            moves = {**moves,
-                     **self.down_left_jump(row + 2, col + 2, piece, moves),
-                     **self.down_right_jump(row + 2, col + 2, piece, moves),
-                     **self.up_right_jump(row + 2, col + 2, piece, moves)}
-
-        return moves
-
-    def all_jumps(self, row, col, piece):
-        moves = {**self.up_left_jump(row, col, piece, {}),
-                 **self.up_right_jump(row, col, piece, {}),
-                 **self.down_left_jump(row, col, piece, {}),
-                 **self.down_right_jump(row, col, piece, {})}
-        return moves
+    def repetitions(self):
+        # Earlier occurrences of the current position with the same side to
+        # move: those are an even number of plies back, within quiet_plies.
+        history = self.history
+        count = 0
+        for i in range(len(history) - 2, max(len(history) - self.quiet_plies, 0) - 1, -2):
+            if history[i] == self.hash:
+                count += 1
+        return count
+
+    def is_drawn(self):
+        # Draw test for search nodes: one repetition is enough there, since
+        # whichever side went back to the position can keep doing so.
+        return self.quiet_plies >= NO_PROGRESS_PLIES or self.repetitions() > 0
+
+    def result(self, color):
+        # (winner name or 'draw', reason) once the game is over with color to
+        # move, otherwise None
+        if not self.bitboard.get_moves(color):
+            return COLOR_NAMES[opponent(color)], 'no_moves'
+        if self.repetitions() >= REPETITIONS - 1:
+            return 'draw', 'repetition'
+        if self.quiet_plies >= NO_PROGRESS_PLIES:
+            return 'draw', 'no_progress'
+        return None
 
     def get_valid_moves(self, piece):
-        row, col = piece.row, piece.col
         moves = {}
         if piece != 0:
-            if piece.king:
-                moves = {**self.queen_up_left(row, col, piece),
-                         **self.queen_up_right(row, col, piece),
-                         **self.queen_up_right(row, col, piece),
-                         **self.queen_up_right(row, col, piece)}
-
-            elif piece.color == WHITE:
-                forward_moves = {**self.up_left_move(row, col), **self.up_right_move(row, col)}
-                jumping_moves = self.all_jumps(row, col, piece)
-                moves = {**forward_moves, **jumping_moves}
-
-            elif piece.color == RED:
-                forward_moves = {**self.down_left_move(row, col), **self.down_right_move(row, col)}
-                jumping_moves = self.all_jumps(row, col, piece)
-                moves = {**forward_moves, **jumping_moves}
-            if moves.values():
-                max_len_move = len(max(moves.values(), key=len))
-            else:
-                max_len_move = 0
-            moves = {k: v for k, v in moves.items() if len(v) >= max_len_move}
-            return moves
-        else:
-            return {}
+            src = square(piece.row, piece.col)
+            for move in self.bitboard.get_moves(piece.color):
+                if move[0] == src:
+                    moves[row_col(move[1])] = [self.get_piece(*row_col(sq)) for sq in squares(move[2])]
+        return moves
 
     def get_all_pieces(self, color):
-        pieces = []
-        for row in self.board:
-            for piece in row:
-                if piece != 0 and piece.color == color:
-                    pieces.append(piece)
-        return pieces
-
-
-    def red_evaluate(self):
-        return self.white_left - self.red_left + (self.white_kings * 2 - self.red_kings * 2)
-
-    def white_evaluate(self):
-        return self.red_left - self.white_left + (self.red_left * 2 - self.white_left * 2)
+        return [self.get_piece(*row_col(sq)) for sq in squares(self.bitboard.pieces(color))]
+
+    def evaluate(self, color):
+        # score from color's point of view
+        score = self.score if color == WHITE else -self.score
+        mobility = self.evaluation.weights['mobility']
+        if mobility:
+            score += mobility * (len(self.bitboard.get_moves(color)) - len(self.bitboard.get_moves(opponent(color))))
+        return score
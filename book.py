@@ -0,0 +1,145 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import opponent
+from board import Board
+from constants import WHITE, RED
+from search import iterative_deepening
+from transposition import TranspositionTable
+
+MAGIC = b'CKBK'
+# 2: only the captures taking the most pieces are legal
+VERSION = 2
+HEADER = struct.Struct('<4sHHI')
+# key, captured mask, src, dst, promotes, weight
+SLOT = struct.Struct('<QIBBBH')
+
+BOOK_PLIES = 10
+BOOK_DEPTH = 8
+EXPLORE = 0.25
+MAX_WEIGHT = 0xFFFF
+
+
+def _self_play(seed, plies, depth, explore):
+    # One self-play game from the start position. Every position is searched
+    # to `depth` and the searched move is recorded; with probability
+    # `explore` a random move is played instead so games branch out.
+    rng = random.Random(seed)
+    board = Board()
+    # the engine colour alternates every ply, so each side keeps its own table
+    tts = {color: TranspositionTable(4) for color in (WHITE, RED)}
+    color = WHITE
+    played = []
+    for _ in range(plies):
+        moves = board.get_moves(color)
+        if not moves:
+            break
+        result = iterative_deepening(board, opponent(color), max_depth=depth, tt=tts[color])
+        played.append((board.key(color), result.move))
+        move = rng.choice(moves) if rng.random() < explore else result.move
+        board.make_move(move)
+        color = opponent(color)
+    return played
+
+
+class BookBuilder:
+    def __init__(self):
+        # key -> {move: weight}
+        self.entries = {}
+
+    def add(self, key, move, weight=1):
+        moves = self.entries.setdefault(key, {})
+        moves[move] = min(moves.get(move, 0) + weight, MAX_WEIGHT)
+
+    def self_play(self, games, plies=BOOK_PLIES, depth=BOOK_DEPTH, explore=EXPLORE, workers=None, seed=0):
+        with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+            seeds = range(seed, seed + games)
+            for played in pool.map(_self_play, seeds, [plies] * games, [depth] * games, [explore] * games):
+                for key, move in played:
+                    self.add(key, move)
+
+    def write(self, path):
+        count = sum(len(moves) for moves in self.entries.values())
+        # power of two, at most half full so probe runs stay short
+        slots = 1
+        while slots < count * 2:
+            slots *= 2
+        mask = slots - 1
+        table = bytearray(SLOT.size * slots)
+        for key, moves in self.entries.items():
+            index = key & mask
+            for (src, dst, captured, promotes), weight in moves.items():
+                while SLOT.unpack_from(table, index * SLOT.size)[5]:
+                    index = (index + 1) & mask
+                SLOT.pack_into(table, index * SLOT.size, key, captured, src, dst, promotes, weight)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, slots))
+            f.write(table)
+
+
+class OpeningBook:
+    # Open-addressing table over a memory-mapped file: a position's moves sit
+    # in consecutive slots from key & mask, so a probe touches a few slots.
+    def __init__(self, path, rng=None):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.slots = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} opening book'.format(path, VERSION))
+        self.mask = self.slots - 1
+        self.rng = rng or random.Random()
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def probe(self, key):
+        # [(move, weight), ...] stored for the key, empty when out of book
+        found = []
+        index = key & self.mask
+        while True:
+            slot_key, captured, src, dst, promotes, weight = SLOT.unpack_from(self.data,
+                                                                              HEADER.size + index * SLOT.size)
+            if not weight:
+                return found
+            if slot_key == key:
+                found.append(((src, dst, captured, bool(promotes)), weight))
+            index = (index + 1) & self.mask
+
+    def choose(self, board, color):
+        # weighted pick among the book moves that are legal here, or None
+        legal = board.get_moves(color)
+        moves = [(move, weight) for move, weight in self.probe(board.key(color)) if move in legal]
+        if not moves:
+            return None
+        pick = self.rng.random() * sum(weight for move, weight in moves)
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+        return moves[-1][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build an opening book from self-play')
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--plies', type=int, default=BOOK_PLIES)
+    parser.add_argument('--depth', type=int, default=BOOK_DEPTH)
+    parser.add_argument('--explore', type=float, default=EXPLORE)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='book.bin')
+    args = parser.parse_args()
+    builder = BookBuilder()
+    builder.self_play(args.games, args.plies, args.depth, args.explore, args.workers, args.seed)
+    builder.write(args.out)
+    print('{} positions, {} moves'.format(len(builder.entries),
+                                          sum(len(moves) for moves in builder.entries.values())))
+
+
+if __name__ == '__main__':
+    main()
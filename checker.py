@@ -1,6 +1,9 @@
 import pygame
-from constants import RED, WHITE, BLUE, SQUARE_SIZE, ROWS
+from constants import RED, WHITE
 from board import Board
+from gamedb import encode_move
+from position import Position
+from gui import draw_board, draw_valid_moves
 
 class Game:
     def __init__(self, win, ai1 = True, ai2 = False):
@@ -9,7 +12,7 @@ class Game:
         self.ai1_color = RED
     
     def update(self):
-        self.board.draw(self.win)
+        draw_board(self.win, self.board)
         self.draw_valid_moves(self.valid_moves)
         pygame.display.update()
 
@@ -18,14 +21,31 @@ class Game:
         self.board = Board()
         self.turn = WHITE
         self.valid_moves = {}
+        # for the game log: the start position and move indices played
+        self.start = Position.from_board(self.board, self.turn)
+        self.moves = []
+        # engine.SearchJob for the move being thought about, if any, and the
+        # key of the position it was started from
+        self.job = None
+        self.job_key = None
 
     def winner(self):
         return self.board.winner()
 
+    def result(self):
+        # (winner name or 'draw', reason) once the game is over, else None
+        return self.board.result(self.turn)
+
     def reset(self):
+        if self.job is not None:
+            self.job.cancel()
         self._init()
 
     def select(self, row, col):
+        # the engine's pieces are not the player's to move, nor is the board
+        # while the engine is still thinking about it
+        if self.job is not None or self.turn == self.ai1_color:
+            return False
         if self.selected:
             result = self._move(row, col)
             if not result:
@@ -43,20 +63,14 @@ class Game:
     def _move(self, row, col):
         piece = self.board.get_piece(row, col)
         if self.selected and piece == 0 and (row, col) in self.valid_moves:
-            self.board.move(self.selected, row, col)
-            skipped = self.valid_moves[(row, col)]
-            if skipped:
-                self.board.remove(skipped)
-            self.change_turn()
+            self.play(self.board.get_move(self.selected, row, col))
         else:
             return False
 
         return True
 
     def draw_valid_moves(self, moves):
-        for move in moves:
-            row, col = move
-            pygame.draw.circle(self.win, BLUE, (col * SQUARE_SIZE + SQUARE_SIZE//2, row * SQUARE_SIZE + SQUARE_SIZE//2), 15)
+        draw_valid_moves(self.win, moves)
 
     def change_turn(self):
         self.valid_moves = {}
@@ -68,6 +82,30 @@ class Game:
     def get_board(self):
         return self.board
 
-    def ai_move(self, board):
-        self.board = board
-        self.change_turn()
\ No newline at end of file
+    def play(self, move):
+        self.moves.append(encode_move(self.board, self.turn, move))
+        self.board.make_move(move)
+        self.change_turn()
+
+    def ai_move(self, move):
+        self.play(move)
+
+    def update_ai(self, engine, color):
+        # Call once per frame while it is the engine's turn; never blocks.
+        # color is the side the engine plays against. Returns the search
+        # result on the frame the engine's move is played, otherwise None.
+        key = self.board.key(self.turn)
+        if self.job is None:
+            self.job = engine.start(self.board, color)
+            self.job_key = key
+            return None
+        if not self.job.done():
+            self.job.poll()
+            return None
+        result = self.job.result()
+        self.job = None
+        if self.job_key != key:
+            # the board changed under the search; think again
+            return None
+        self.ai_move(result.move)
+        return result
\ No newline at end of file
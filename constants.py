@@ -1,5 +1,3 @@
-import pygame
-
 WIDTH, HEIGHT = 800, 800
 ROWS, COLS = 8, 8
 SQUARE_SIZE = WIDTH//COLS
@@ -11,5 +9,7 @@ BLACK = (102, 67, 31)
 BLUE = (230, 87, 87)
 GREY = (128,128,128)
 MINIMAX = True
+COLOR_NAMES = {WHITE: 'white', RED: 'red'}
 
-CROWN = pygame.transform.scale(pygame.image.load('crown.png'), (44, 25))
\ No newline at end of file
+CROWN_FILE = 'crown.png'
+CROWN_SIZE = (44, 25)
@@ -0,0 +1,70 @@
+import time
+
+from ordering import MAX_PLY
+from quiescence import QNODE_LIMIT
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchContext:
+    # Per-search state shared by every node: the transposition table, move
+    # ordering, the time/node budget and the last iteration's principal
+    # variation.
+    CHECK_EVERY = 255
+
+    def __init__(self, tt=None, time_limit=None, node_limit=None, ordering=None, debug_hook=None, batch=False,
+                 tablebase=None, stats=None, quiescence=False, qnode_limit=QNODE_LIMIT, pvs=False,
+                 stop=None):
+        self.tt = tt
+        # stats.SearchStats, filled in when given
+        self.stats = stats
+        self.tablebase = tablebase
+        # score the children of depth-1 minimax nodes with batch.evaluate_batch
+        self.batch = batch
+        self.ordering = ordering
+        # called as debug_hook(board, move) for every generated move
+        self.debug_hook = debug_hook
+        self.ply = 0
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.deadline = None
+        # threading/multiprocessing Event; setting it ends the search like a
+        # timeout
+        self.stop = stop
+        self.nodes = 0
+        # resolve captures at depth 0 instead of evaluating; qnode_limit
+        # caps the capture nodes expanded per search, after which depth-0
+        # nodes are evaluated as they stand
+        self.quiescence = quiescence
+        self.qnode_limit = qnode_limit
+        self.qnodes = 0
+        # principal variation search in alpha_beta
+        self.pvs = pvs
+        self.pv = {}
+        # one reusable move list per remaining depth, so a search does not
+        # allocate a fresh list at every node
+        self.buffers = [[] for _ in range(MAX_PLY)]
+
+    def start(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.ply = 0
+        if self.time_limit is not None:
+            self.deadline = time.perf_counter() + self.time_limit
+        else:
+            self.deadline = None
+
+    def visit(self):
+        self.nodes += 1
+        if __debug__:
+            if self.stats is not None:
+                self.stats.nodes[self.ply] += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout()
+        if not self.nodes & self.CHECK_EVERY:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop is not None and self.stop.is_set():
+                raise SearchTimeout()
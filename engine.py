@@ -0,0 +1,153 @@
+import asyncio
+import itertools
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bitboard import opponent
+from book import OpeningBook
+from position import Position
+from search import SearchResult, iterative_deepening
+from tablebase import Tablebase
+from transposition import TranspositionTable
+
+# Worker state for process mode, created once per process by _init_process.
+_worker = None
+
+
+class _Worker:
+    # Runs searches on one thread; keeps its table, book and tablebase
+    # between searches.
+    def __init__(self, stop, updates, tt_size_mb, tablebase_path, book_path):
+        self.stop = stop
+        self.updates = updates
+        self.tt_size_mb = tt_size_mb
+        # one table per engine colour, as a table's scores are from one
+        # side's point of view; each gets half of the memory
+        self.tts = {}
+        self.tablebase = Tablebase(tablebase_path) if tablebase_path else None
+        self.book = OpeningBook(book_path) if book_path else None
+
+    def search(self, job_id, data, history, color, options):
+        board = Position.from_bytes(data).to_board()
+        board.set_history(*history)
+
+        def progress(result):
+            self.updates.put((job_id, result.value, result.move, result.depth, result.nodes))
+
+        if color not in self.tts:
+            self.tts[color] = TranspositionTable(self.tt_size_mb / 2)
+        return iterative_deepening(board, color, tt=self.tts[color], tablebase=self.tablebase, book=self.book,
+                                   stop=self.stop, progress=progress, **options)
+
+
+def _init_process(stop, updates, tt_size_mb, tablebase_path, book_path):
+    global _worker
+    _worker = _Worker(stop, updates, tt_size_mb, tablebase_path, book_path)
+
+
+def _search_in_process(job_id, data, history, color, options):
+    return _worker.search(job_id, data, history, color, options)
+
+
+class SearchJob:
+    # Handle for one background search. progress is the result of the last
+    # completed iteration, refreshed by poll().
+    def __init__(self, engine, job_id, future):
+        self.engine = engine
+        self.id = job_id
+        self.future = future
+        self.progress = SearchResult()
+
+    def poll(self):
+        self.engine.poll()
+        return self.progress
+
+    def best_move(self):
+        return self.poll().move
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def cancel(self):
+        # ends the search at its next check; result() then holds the last
+        # completed iteration
+        if self.engine.current is self:
+            self.engine.stop.set()
+        self.future.cancel()
+
+    async def wait(self):
+        return await asyncio.wrap_future(self.future)
+
+
+class Engine:
+    # Runs iterative_deepening on one background worker, a thread or a
+    # separate process, so callers never block on a search. One search runs
+    # at a time; starting a new one cancels the previous one. Positions are
+    # handed over as Position bytes, so the caller's Board can keep changing.
+    def __init__(self, use_process=True, tt_size_mb=64, tablebase_path=None, book_path=None, **options):
+        self.options = options
+        self.current = None
+        self.jobs = {}
+        self.ids = itertools.count()
+        if use_process:
+            context = multiprocessing.get_context()
+            self.stop = context.Event()
+            self.updates = context.Queue()
+            self.pool = ProcessPoolExecutor(1, mp_context=context, initializer=_init_process,
+                                            initargs=(self.stop, self.updates, tt_size_mb, tablebase_path,
+                                                      book_path))
+            self.submit = lambda *args: self.pool.submit(_search_in_process, *args)
+        else:
+            self.stop = threading.Event()
+            self.updates = queue.Queue()
+            self.pool = ThreadPoolExecutor(1)
+            worker = _Worker(self.stop, self.updates, tt_size_mb, tablebase_path, book_path)
+            self.submit = lambda *args: self.pool.submit(worker.search, *args)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.current is not None:
+            self.current.cancel()
+        self.pool.shutdown()
+
+    def start(self, board, color, **options):
+        # color is the side the engine plays against, as in iterative_deepening
+        previous = self.current
+        if previous is not None and not previous.done():
+            previous.cancel()
+            if not previous.future.cancelled():
+                # the worker notices the stop flag within a few hundred nodes
+                previous.future.exception()
+        self.stop.clear()
+        job_id = next(self.ids)
+        data = Position.from_board(board, opponent(color)).to_bytes()
+        # the repeatable tail of the game, so the search sees repetitions
+        history = (board.recent_history(), board.quiet_plies)
+        future = self.submit(job_id, data, history, color, dict(self.options, **options))
+        self.current = job = SearchJob(self, job_id, future)
+        self.jobs = {job_id: job}
+        return job
+
+    def poll(self):
+        # move progress reports from the worker onto their jobs
+        while True:
+            try:
+                job_id, value, move, depth, nodes = self.updates.get_nowait()
+            except queue.Empty:
+                return
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.progress = SearchResult(value, move, depth, nodes)
+
+    async def search(self, board, color, **options):
+        return await self.start(board, color, **options).wait()
@@ -0,0 +1,98 @@
+import json
+import time
+
+from bitboard import SQUARES, row_col, squares
+from constants import ROWS, WHITE, RED
+
+# scores for decided games (tablebase hits) sit far outside anything the
+# piece-square evaluation can produce
+WIN_SCORE = 100000
+
+DEFAULT_WEIGHTS = {
+    'man': 100,
+    'king': 300,
+    # per row a man has advanced from its own back row
+    'advancement': 4,
+    # men still guarding their own back row
+    'back_row': 12,
+    # pieces on the four central files of the two middle rows
+    'centre': 6,
+    # legal moves for the side to move; not incremental, so it costs a move
+    # generation per leaf and is off by default
+    'mobility': 0,
+}
+
+
+def is_centre(sq):
+    row, col = row_col(sq)
+    return 3 <= row <= 4 and 2 <= col <= 5
+
+
+class Evaluation:
+    # Piece-square evaluation. Every incremental term is folded into one
+    # table per (colour, king) so Board can keep the score up to date as
+    # pieces move, are captured or are crowned.
+    def __init__(self, weights=None):
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            unknown = set(weights) - set(DEFAULT_WEIGHTS)
+            if unknown:
+                raise ValueError('unknown evaluation terms: {}'.format(', '.join(sorted(unknown))))
+            self.weights.update(weights)
+        self.tables = {WHITE: (self._table(WHITE, False), self._table(WHITE, True)),
+                       RED: (self._table(RED, False), self._table(RED, True))}
+
+    def _table(self, color, king):
+        w = self.weights
+        table = []
+        for sq in range(SQUARES):
+            row, col = row_col(sq)
+            value = w['centre'] if is_centre(sq) else 0
+            if king:
+                value += w['king']
+            else:
+                advanced = ROWS - 1 - row if color == WHITE else row
+                value += w['man'] + w['advancement'] * advanced
+                if advanced == 0:
+                    value += w['back_row']
+            table.append(value)
+        return table
+
+    def score(self, bits):
+        # full recompute, white's point of view
+        white_men, white_kings = self.tables[WHITE]
+        red_men, red_kings = self.tables[RED]
+        total = 0
+        for sq in squares(bits.white & ~bits.kings):
+            total += white_men[sq]
+        for sq in squares(bits.white & bits.kings):
+            total += white_kings[sq]
+        for sq in squares(bits.red & ~bits.kings):
+            total -= red_men[sq]
+        for sq in squares(bits.red & bits.kings):
+            total -= red_kings[sq]
+        return total
+
+
+DEFAULT_EVALUATION = Evaluation()
+
+# Weights files are written by tune.py:
+#   {"format": "checkers-weights", "version": 1, "weights": {...}, ...}
+# with any extra keys describing how the weights were fitted.
+WEIGHTS_FORMAT = 'checkers-weights'
+WEIGHTS_VERSION = 1
+
+
+def save_weights(path, weights, **info):
+    data = dict(info, format=WEIGHTS_FORMAT, version=WEIGHTS_VERSION,
+                created=time.strftime('%Y-%m-%dT%H:%M:%S'), weights=weights)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def load_weights(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get('format') != WEIGHTS_FORMAT or data.get('version') != WEIGHTS_VERSION:
+        raise ValueError('{} is not a version {} weights file'.format(path, WEIGHTS_VERSION))
+    return Evaluation(data['weights'])
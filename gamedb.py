@@ -0,0 +1,248 @@
+import argparse
+import heapq
+import mmap
+import struct
+import tempfile
+import time
+
+from bitboard import opponent, move_name
+from position import Position, PACKED
+
+# Game log: a header, then one record per game, appended and never
+# rewritten:
+#   start position (Position bytes), result, move count, one byte per move
+# A move is stored as its index in the legal move list of the position it
+# is played from, so replaying a game regenerates the moves.
+LOG_MAGIC = b'CKGL'
+INDEX_MAGIC = b'CKGI'
+# 2: only the captures taking the most pieces are legal
+VERSION = 2
+HEADER = struct.Struct('<4sH')
+RECORD = struct.Struct('<{}sBH'.format(PACKED.size))
+INDEX_HEADER = struct.Struct('<4sHQ')
+# position key, record offset
+INDEX_ENTRY = struct.Struct('<QQ')
+
+# None for a game that was not finished
+RESULTS = {None: 0, 'white': 1, 'red': 2, 'draw': 3}
+RESULT_NAMES = {value: name for name, value in RESULTS.items()}
+
+# (key, offset) pairs sorted in memory at a time while building an index
+INDEX_CHUNK = 1 << 20
+
+
+def encode_move(board, color, move):
+    return board.get_moves(color).index(move)
+
+
+class GameRecord:
+    def __init__(self, offset, start, result, moves):
+        self.offset = offset
+        self.start = start
+        self.result = result
+        # bytes of move indices
+        self.moves = moves
+
+    def __len__(self):
+        return len(self.moves)
+
+    def replay(self):
+        # Yields (position, move) for every ply and finally (position, None),
+        # one position at a time.
+        board = self.start.to_board()
+        color = self.start.color
+        for index in self.moves:
+            move = board.get_moves(color)[index]
+            yield Position.from_board(board, color), move
+            board.make_move(move)
+            color = opponent(color)
+        yield Position.from_board(board, color), None
+
+    def keys(self):
+        # Zobrist keys of every position in the game, side to move included
+        board = self.start.to_board()
+        color = self.start.color
+        for index in self.moves:
+            yield board.key(color)
+            board.make_move(board.get_moves(color)[index])
+            color = opponent(color)
+        yield board.key(color)
+
+
+class GameLog:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(LOG_MAGIC, VERSION))
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def append(self, start, moves, result=None):
+        # start is a Position, moves the move indices; returns the offset
+        if len(moves) > 0xFFFF:
+            raise ValueError('game too long to record')
+        offset = self.file.tell()
+        self.file.write(RECORD.pack(start.to_bytes(), RESULTS[result], len(moves)) + bytes(moves))
+        self.file.flush()
+        return offset
+
+
+def _check_header(data, magic, path):
+    found, version = HEADER.unpack_from(data, 0)
+    if found != magic or version != VERSION:
+        raise ValueError('{} is not a version {} {} file'.format(path, VERSION, magic.decode()))
+
+
+def read_games(path, offset=None):
+    # Streams records from the log one at a time; with offset, yields only
+    # the record stored there.
+    with open(path, 'rb') as f:
+        _check_header(f.read(HEADER.size), LOG_MAGIC, path)
+        if offset is not None:
+            f.seek(offset)
+        while True:
+            position = f.tell()
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                return
+            start, result, count = RECORD.unpack(head)
+            moves = f.read(count)
+            if len(moves) < count:
+                # a record cut short by a crash mid-append
+                return
+            yield GameRecord(position, Position.from_bytes(start), RESULT_NAMES[result], moves)
+            if offset is not None:
+                return
+
+
+def read_game(path, offset):
+    for record in read_games(path, offset):
+        return record
+    raise ValueError('no game at offset {}'.format(offset))
+
+
+def build_index(log_path, index_path):
+    # Writes every (position key, game offset) pair, sorted by key. Pairs are
+    # sorted in chunks spilled to temporary files and merged, so memory
+    # stays bounded however large the log is.
+    chunks = []
+    pairs = []
+
+    def spill():
+        pairs.sort()
+        chunk = tempfile.TemporaryFile()
+        chunk.write(b''.join(INDEX_ENTRY.pack(key, offset) for key, offset in pairs))
+        chunk.seek(0)
+        chunks.append(chunk)
+        pairs.clear()
+
+    for record in read_games(log_path):
+        for key in set(record.keys()):
+            pairs.append((key, record.offset))
+        if len(pairs) >= INDEX_CHUNK:
+            spill()
+    if pairs or not chunks:
+        spill()
+
+    def read_chunk(chunk):
+        while True:
+            data = chunk.read(INDEX_ENTRY.size * 4096)
+            if not data:
+                return
+            yield from INDEX_ENTRY.iter_unpack(data)
+
+    count = 0
+    with open(index_path, 'wb') as out:
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION, 0))
+        for key, offset in heapq.merge(*(read_chunk(chunk) for chunk in chunks)):
+            out.write(INDEX_ENTRY.pack(key, offset))
+            count += 1
+        out.seek(0)
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION, count))
+    for chunk in chunks:
+        chunk.close()
+    return count
+
+
+class PositionIndex:
+    # Binary search over the memory-mapped index file.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = INDEX_HEADER.unpack_from(self.data, 0)
+        if magic != INDEX_MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} game index'.format(path, VERSION))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def _key(self, i):
+        return INDEX_ENTRY.unpack_from(self.data, INDEX_HEADER.size + i * INDEX_ENTRY.size)[0]
+
+    def offsets(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.count:
+            entry_key, offset = INDEX_ENTRY.unpack_from(self.data, INDEX_HEADER.size + low * INDEX_ENTRY.size)
+            if entry_key != key:
+                break
+            found.append(offset)
+            low += 1
+        return found
+
+    def games(self, log_path, position):
+        # every recorded game that passes through position
+        board = position.to_board()
+        for offset in self.offsets(board.key(position.color)):
+            yield read_game(log_path, offset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Game log tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    index = commands.add_parser('index', help='build the position index of a log')
+    index.add_argument('log')
+    index.add_argument('index')
+    find = commands.add_parser('find', help='list the games through a position')
+    find.add_argument('log')
+    find.add_argument('index')
+    find.add_argument('fen')
+    show = commands.add_parser('show', help='print the games in a log')
+    show.add_argument('log')
+    args = parser.parse_args()
+
+    if args.command == 'index':
+        started = time.perf_counter()
+        count = build_index(args.log, args.index)
+        print('{} entries in {:.1f}s'.format(count, time.perf_counter() - started))
+    elif args.command == 'find':
+        started = time.perf_counter()
+        index = PositionIndex(args.index)
+        records = list(index.games(args.log, Position.from_fen(args.fen)))
+        for record in records:
+            print(record.offset, record.result, len(record))
+        print('{} games in {:.1f}ms'.format(len(records), (time.perf_counter() - started) * 1000))
+    else:
+        for record in read_games(args.log):
+            names = [move_name(move) for position, move in record.replay() if move is not None]
+            print(record.offset, record.start.fen(), record.result, ' '.join(names))
+
+
+if __name__ == '__main__':
+    main()
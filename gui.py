@@ -0,0 +1,54 @@
+import pygame
+
+from constants import BLACK, ROWS, COLS, RED, WHITE, SQUARE_SIZE, GREY, BLUE, CROWN_FILE, CROWN_SIZE
+from piece import Piece
+from bitboard import row_col
+
+_crown = None
+
+
+def get_crown():
+    global _crown
+    if _crown is None:
+        _crown = pygame.transform.scale(pygame.image.load(CROWN_FILE), CROWN_SIZE)
+    return _crown
+
+
+def draw_squares(win):
+    win.fill(BLACK)
+    for row in range(ROWS):
+        for col in range(row % 2, COLS, 2):
+            pygame.draw.rect(win, (255, 255, 255), (row * SQUARE_SIZE, col * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+
+def draw_piece(win, piece):
+    radius = SQUARE_SIZE // 2 - Piece.PADDING
+    pygame.draw.circle(win, GREY, (piece.x, piece.y), radius + Piece.OUTLINE)
+    pygame.draw.circle(win, piece.color, (piece.x, piece.y), radius)
+    if piece.king:
+        crown = get_crown()
+        win.blit(crown, (piece.x - crown.get_width() // 2, piece.y - crown.get_height() // 2))
+
+
+def draw_board(win, board):
+    draw_squares(win)
+    for color in (RED, WHITE):
+        for piece in board.get_all_pieces(color):
+            draw_piece(win, piece)
+
+
+def draw_valid_moves(win, moves):
+    for move in moves:
+        row, col = move
+        pygame.draw.circle(win, BLUE, (col * SQUARE_SIZE + SQUARE_SIZE//2, row * SQUARE_SIZE + SQUARE_SIZE//2), 15)
+
+
+def search_hook(win):
+    # Debug hook for SearchContext: redraws every move the search generates.
+    def hook(board, move):
+        piece = board.get_piece(*row_col(move[0]))
+        draw_board(win, board)
+        pygame.draw.circle(win, (0,255,0), (piece.x, piece.y), 50, 5)
+        draw_valid_moves(win, board.get_valid_moves(piece).keys())
+        pygame.display.update()
+    return hook
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import json
+import time
+
+from server import DEFAULT_PORT
+
+MOVES_PER_GAME = 20
+MOVETIME = 100
+
+
+async def play(connect, moves, movetime, latencies, errors):
+    # One session playing both sides: each bestmove is appended to the
+    # position and searched again.
+    reader, writer = await connect()
+    played = []
+    writer.write(b'newgame\n')
+    for _ in range(moves):
+        line = 'position startpos' + (' moves ' + ' '.join(played) if played else '')
+        writer.write((line + '\ngo movetime {}\n'.format(movetime)).encode())
+        await writer.drain()
+        sent = time.perf_counter()
+        while True:
+            reply = (await reader.readline()).decode().split()
+            if not reply:
+                errors.append('connection closed')
+                writer.close()
+                return
+            if reply[0] in ('bestmove', 'error'):
+                break
+        if reply[0] == 'error':
+            errors.append(' '.join(reply[1:]))
+            break
+        latencies.append(time.perf_counter() - sent)
+        if reply[1] == 'none':
+            break
+        played.append(reply[1])
+    writer.write(b'quit\n')
+    await writer.drain()
+    writer.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(sessions, moves=MOVES_PER_GAME, movetime=MOVETIME, host='127.0.0.1', port=DEFAULT_PORT, path=None):
+    if path:
+        connect = lambda: asyncio.open_unix_connection(path)
+    else:
+        connect = lambda: asyncio.open_connection(host, port)
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(play(connect, moves, movetime, latencies, errors) for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    return {'sessions': sessions, 'moves': len(latencies), 'errors': len(errors),
+            'p50_ms': percentile(latencies, 0.50) * 1000, 'p99_ms': percentile(latencies, 0.99) * 1000,
+            'moves_per_sec': len(latencies) / elapsed if elapsed else 0.0, 'seconds': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test a running engine server')
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--moves', type=int, default=MOVES_PER_GAME)
+    parser.add_argument('--movetime', type=int, default=MOVETIME, help='milliseconds per move')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help='connect to a Unix socket at this path instead')
+    args = parser.parse_args()
+    report = asyncio.run(run(args.sessions, args.moves, args.movetime, args.host, args.port, args.unix))
+    print(json.dumps(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,41 @@
-from datetime import datetime
+import os
 
 import pygame
 
-from alpha_beta import alpha_beta
 from constants import WIDTH, HEIGHT, SQUARE_SIZE, RED, WHITE, MINIMAX
+from book import OpeningBook
 from checker import Game
-from minimax import minimax
+from engine import Engine
+from evaluation import load_weights
+from gamedb import GameLog
+from gui import search_hook
+from search import iterative_deepening
+from tablebase import Tablebase
+from transposition import TranspositionTable
 
 FPS = 60
-
-WIN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption('Checkers')
+TT_SIZE_MB = 64
+MOVE_TIME = 1.0
+# follow capture sequences past the search horizon
+QUIESCENCE = True
+# principal variation search, with an aspiration window this wide around
+# the previous iteration's score (None for full windows)
+PVS = True
+ASPIRATION = 50
+# generated with `python tablebase.py`; used when present
+TABLEBASE_FILE = 'tablebase.bin'
+# generated with `python book.py`; used when present
+BOOK_FILE = 'book.bin'
+# written by `python tune.py`; the built-in weights are used without it
+WEIGHTS_FILE = 'weights.json'
+# append per-move search statistics as JSON lines / keep a Prometheus
+# textfile up to date; None to disable
+STATS_LOG = None
+STATS_METRICS = None
+# every game played is appended here; None to disable
+GAME_LOG = 'games.log'
+# redraw every move the engine considers (slow, for debugging only)
+DEBUG_SEARCH = False
 
 
 def get_row_col_from_mouse(pos):
@@ -22,27 +47,48 @@ def get_row_col_from_mouse(pos):
 
 def main():
     run = True
+    win = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption('Checkers')
     clock = pygame.time.Clock()
-    game = Game(WIN)
-
+    game = Game(win)
+    tablebase_path = TABLEBASE_FILE if os.path.exists(TABLEBASE_FILE) else None
+    book_path = BOOK_FILE if os.path.exists(BOOK_FILE) else None
+    options = dict(use_minimax=MINIMAX, time_limit=MOVE_TIME, quiescence=QUIESCENCE, pvs=PVS,
+                   aspiration=ASPIRATION)
+    if os.path.exists(WEIGHTS_FILE):
+        options['evaluation'] = load_weights(WEIGHTS_FILE)
+    if DEBUG_SEARCH:
+        # the debug hook draws from inside the search, so search inline
+        engine = None
+        tt = TranspositionTable(TT_SIZE_MB)
+        debug_hook = search_hook(win)
+        tablebase = Tablebase(tablebase_path) if tablebase_path else None
+        book = OpeningBook(book_path) if book_path else None
+    else:
+        engine = Engine(tt_size_mb=TT_SIZE_MB, tablebase_path=tablebase_path, book_path=book_path, **options)
 
     while run:
         clock.tick(FPS)
 
+        outcome = game.result()
+        if outcome is not None:
+            print('{} ({})'.format(*outcome))
+            break
+
         if game.turn == RED:
-            if MINIMAX:
-                now = datetime.now().timestamp()
-                value, new_board = minimax(game.get_board(), 4,True, WHITE, game)
-                print("Passed: ", datetime.now().timestamp() - now )
+            if engine is None:
+                result = iterative_deepening(game.get_board(), WHITE, tt=tt, debug_hook=debug_hook,
+                                             tablebase=tablebase, book=book, **options)
+                game.ai_move(result.move)
             else:
-                now = datetime.now().timestamp()
-                value, new_board = alpha_beta(game.get_board(),5, float('-inf'), float('inf'), True, WHITE, game)
-                print("Passed: ", datetime.now().timestamp() - now )
-            game.ai_move(new_board)
-
-        if game.winner() != None:
-            print(game.winner())
-            run = False
+                result = game.update_ai(engine, WHITE)
+            if result is not None:
+                print("Passed: ", result.elapsed, "depth:", result.depth)
+                if result.stats is not None:
+                    if STATS_LOG:
+                        result.stats.write_json(STATS_LOG, depth=result.depth)
+                    if STATS_METRICS:
+                        result.stats.write_prometheus(STATS_METRICS)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -55,7 +101,13 @@ def main():
 
         game.update()
 
+    if GAME_LOG and game.moves:
+        with GameLog(GAME_LOG) as log:
+            log.append(game.start, game.moves, outcome[0] if outcome else None)
+    if engine is not None:
+        engine.close()
     pygame.quit()
 
 
-main()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
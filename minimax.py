@@ -1,69 +1,131 @@
-from copy import deepcopy
-import pygame
-
 from constants import WHITE, RED
+from quiescence import quiescence
+from tablebase import score as tablebase_score
+from transposition import EXACT
 
 
-def minimax(position, depth, max_player, color, game):
-    if depth == 0 or position.winner() != None:
-        if color == WHITE:
-            return position.white_evaluate(), position
-        if color == RED:
-            return position.red_evaluate(), position
+def minimax(position, depth, max_player, color, context=None):
+    # color is the side the engine plays against; the engine maximises.
+    # A repeated position inside the tree, or one past the no-progress
+    # limit, is a draw.
+    if context is not None and context.ply and position.is_drawn():
+        return 0, None
+    if depth == 0 and context is not None and context.quiescence:
+        return quiescence(position, float('-inf'), float('inf'), max_player, color, context), None
+    if context is not None:
+        context.visit()
     if color == WHITE:
         ai_color = RED
         enemy_color = WHITE
     elif color == RED:
         ai_color = WHITE
         enemy_color = RED
+    if depth == 0 or position.winner() != None:
+        if __debug__:
+            if context is not None and context.stats is not None:
+                context.stats.leaves += 1
+        return position.evaluate(ai_color), None
+
+    if context is not None and context.tablebase is not None and context.ply \
+            and context.tablebase.covers(position.bitboard):
+        side = ai_color if max_player else enemy_color
+        result = context.tablebase.probe(position.bitboard, side)
+        if result is not None:
+            return tablebase_score(result, side == ai_color, context.ply), None
+
+    tt = context.tt if context is not None else None
+    if tt is not None:
+        key = position.key(ai_color if max_player else enemy_color)
+        entry = tt.probe(key)
+        if __debug__:
+            if context.stats is not None:
+                context.stats.probe(entry)
+        if entry is not None and entry[0] >= depth and entry[1] == EXACT:
+            return entry[2], entry[3]
+
+    if depth == 1 and context is not None and context.batch and not context.quiescence \
+            and not position.evaluation.weights['mobility']:
+        value, best_move = evaluate_frontier(position, max_player, ai_color if max_player else enemy_color,
+                                             ai_color, context)
+        if tt is not None:
+            tt.store(key, depth, EXACT, value, best_move)
+        return value, best_move
 
     if max_player:
         maxEval = float('-inf')
         best_move = None
-        for move in get_all_moves(position, ai_color, game):
-            evaluation = minimax(move, depth - 1, False, enemy_color, game)[0]
+        for move in get_all_moves(position, ai_color, context, depth):
+            record = position.make_move(move)
+            if context is not None:
+                context.ply += 1
+            evaluation = minimax(position, depth - 1, False, color, context)[0]
+            if context is not None:
+                context.ply -= 1
+            position.unmake_move(record)
             maxEval = max(maxEval, evaluation)
             if maxEval == evaluation:
                 best_move = move
 
+        if tt is not None:
+            tt.store(key, depth, EXACT, maxEval, best_move)
         return maxEval, best_move
     else:
         minEval = float('inf')
         best_move = None
-        for move in get_all_moves(position, enemy_color, game):
-            evaluation = minimax(move, depth - 1, True, ai_color, game)[0]
+        for move in get_all_moves(position, enemy_color, context, depth):
+            record = position.make_move(move)
+            if context is not None:
+                context.ply += 1
+            evaluation = minimax(position, depth - 1, True, color, context)[0]
+            if context is not None:
+                context.ply -= 1
+            position.unmake_move(record)
             minEval = min(minEval, evaluation)
             if minEval == evaluation:
                 best_move = move
 
+        if tt is not None:
+            tt.store(key, depth, EXACT, minEval, best_move)
         return minEval, best_move
 
 
-def simulate_move(piece, move, board, game, skip):
-    board.move(piece, move[0], move[1])
-    if skip:
-        board.remove(skip)
-
-    return board
-
+def evaluate_frontier(position, max_player, to_move, ai_color, context):
+    # Scores all children of a depth-1 node with one batch evaluation call;
+    # picks the same move as the scalar loop (the last of equal scores).
+    # batch is imported here so the plain search never loads numpy.
+    from batch import encode, evaluate_batch
+    moves = get_all_moves(position, to_move, context, 1)
+    if not moves:
+        return float('-inf') if max_player else float('inf'), None
+    rows = []
+    drawn = []
+    context.ply += 1
+    for move in moves:
+        context.visit()
+        record = position.make_move(move)
+        rows.append(encode(position.bitboard))
+        drawn.append(position.is_drawn())
+        position.unmake_move(record)
+    context.ply -= 1
+    if __debug__:
+        if context.stats is not None:
+            context.stats.leaves += len(moves)
+    scores = evaluate_batch(rows, position.evaluation)
+    sign = 1 if ai_color == WHITE else -1
+    best_value, best_move = None, None
+    for move, score, draw in zip(moves, scores, drawn):
+        value = 0 if draw else sign * int(score)
+        if best_value is None or (value >= best_value if max_player else value <= best_value):
+            best_value, best_move = value, move
+    return best_value, best_move
 
-def get_all_moves(board, color, game):
-    moves = []
 
-    for piece in board.get_all_pieces(color):
-        valid_moves = board.get_valid_moves(piece)
-        for move, skip in valid_moves.items():
-            # draw_moves(game, board, piece)
-            temp_board = deepcopy(board)
-            temp_piece = temp_board.get_piece(piece.row, piece.col)
-            new_board = simulate_move(temp_piece, move, temp_board, game, skip)
-            moves.append(new_board)
+def get_all_moves(board, color, context=None, depth=None):
+    if context is not None and depth is not None:
+        moves = board.get_moves(color, context.buffers[depth])
+    else:
+        moves = board.get_moves(color)
+    if context is not None and context.debug_hook is not None:
+        for move in moves:
+            context.debug_hook(board, move)
     return moves
-
-# def draw_moves(game, board, piece):
-#     valid_moves = board.get_valid_moves(piece)
-#     board.draw(game.win)
-#     pygame.draw.circle(game.win, (0,255,0), (piece.x, piece.y), 50, 5)
-#     game.draw_valid_moves(valid_moves.keys())
-#     pygame.display.update()
-#     #pygame.time.delay(100)
@@ -0,0 +1,67 @@
+from bitboard import SQUARES
+
+CAPTURE_SCORE = 1 << 30
+PROMOTION_SCORE = 1 << 29
+KILLER_SCORE = 1 << 28
+MAX_PLY = 128
+
+
+class MoveOrdering:
+    # Orders moves as: hint (TT/PV move), captures by number of pieces taken,
+    # promotions, the two killer moves of the ply, then the history score.
+    def __init__(self):
+        self.history = [[0] * SQUARES for _ in range(SQUARES)]
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.cutoffs = [0] * MAX_PLY
+        self.first_cutoffs = [0] * MAX_PLY
+        self.nodes = [0] * MAX_PLY
+
+    def new_search(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for row in self.history:
+            for dst in range(SQUARES):
+                row[dst] >>= 1
+        self.cutoffs = [0] * MAX_PLY
+        self.first_cutoffs = [0] * MAX_PLY
+        self.nodes = [0] * MAX_PLY
+
+    def score(self, move, ply):
+        src, dst, captured, promotes = move
+        if captured:
+            return CAPTURE_SCORE + (captured.bit_count() << 1) + promotes
+        if promotes:
+            return PROMOTION_SCORE
+        if move in self.killers[ply]:
+            return KILLER_SCORE
+        return self.history[src][dst]
+
+    def order(self, moves, ply, hint=None):
+        self.nodes[ply] += 1
+        moves.sort(key=lambda move: self.score(move, ply), reverse=True)
+        if hint is not None and hint in moves:
+            moves.remove(hint)
+            moves.insert(0, hint)
+        return moves
+
+    def cutoff(self, move, ply, depth, index):
+        self.cutoffs[ply] += 1
+        if index == 0:
+            self.first_cutoffs[ply] += 1
+        if move[2]:
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move[0]][move[1]] += depth * depth
+
+    def report(self):
+        lines = []
+        for ply in range(MAX_PLY):
+            if not self.nodes[ply]:
+                continue
+            cutoffs = self.cutoffs[ply]
+            lines.append({'ply': ply, 'nodes': self.nodes[ply], 'cutoffs': cutoffs,
+                          'first_move_cutoffs': self.first_cutoffs[ply],
+                          'first_move_rate': self.first_cutoffs[ply] / cutoffs if cutoffs else 0.0})
+        return lines
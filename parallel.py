@@ -0,0 +1,139 @@
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from alpha_beta import alpha_beta
+from bitboard import opponent
+from board import Board
+from constants import WHITE
+from context import SearchContext
+from ordering import MoveOrdering
+from position import Position
+from search import SearchResult
+from transposition import TranspositionTable
+
+# Worker process state, set up once per process by _init_worker.
+_bound = None
+_tt_size_mb = None
+_tables = None
+
+
+def _init_worker(bound, tt_size_mb):
+    global _bound, _tt_size_mb, _tables
+    _bound = bound
+    _tt_size_mb = tt_size_mb
+    _tables = {}
+
+
+def _tables_for(ai_color):
+    # a table's scores are from one side's point of view, so each engine
+    # colour gets its own table and ordering, with half of the memory
+    if ai_color not in _tables:
+        _tables[ai_color] = (TranspositionTable(_tt_size_mb / 2), MoveOrdering())
+    return _tables[ai_color]
+
+
+def _raise_bound(bound, value):
+    with bound.get_lock():
+        if value > bound.value:
+            bound.value = value
+
+
+def _search_root_move(data, history, move, depth, color):
+    # Positions travel as Position bytes, never as pickled Board objects;
+    # history is the repeatable tail of the game, so the workers see the
+    # same repetition and no-progress draws as a serial search.
+    board = Position.from_bytes(data).to_board()
+    board.set_history(*history)
+    board.make_move(move)
+    tt, ordering = _tables_for(opponent(color))
+    tt.new_search()
+    ordering.new_search()
+    context = SearchContext(tt, ordering=ordering)
+    context.start()
+    context.ply = 1
+    # Everything searched so far by any worker is a lower bound for the root.
+    alpha = _bound.value
+    value = alpha_beta(board, depth - 1, alpha, float('inf'), False, color, context)[0]
+    _raise_bound(_bound, value)
+    return move, value, context.nodes
+
+
+class ParallelSearch:
+    # Splits the root moves of an alpha-beta search across a process pool.
+    # Workers share the best root score found so far through a shared double,
+    # so subtrees started later are searched with a tighter alpha.
+    def __init__(self, workers=None, tt_size_mb=16):
+        self.workers = workers or os.cpu_count() or 1
+        self.bound = multiprocessing.Value('d', float('-inf'))
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(self.bound, tt_size_mb))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def search(self, board, color, depth, young_brothers_wait=True):
+        # color is the side the engine plays against, as in alpha_beta.
+        started = time.perf_counter()
+        moves = MoveOrdering().order(board.get_moves(opponent(color)), 0)
+        if len(moves) <= 1 or depth <= 1:
+            value, move = alpha_beta(board.copy(), max(depth, 1), float('-inf'), float('inf'), True, color)
+            return SearchResult(value, move, depth, 0, time.perf_counter() - started)
+
+        self.bound.value = float('-inf')
+        data = Position.from_board(board, opponent(color)).to_bytes()
+        history = (board.recent_history(), board.quiet_plies)
+        results = []
+        if young_brothers_wait:
+            # search the eldest brother first so every other root move starts
+            # with a real bound
+            results.append(self.pool.submit(_search_root_move, data, history, moves[0], depth, color).result())
+            moves = moves[1:]
+
+        futures = [self.pool.submit(_search_root_move, data, history, move, depth, color) for move in moves]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+        best_value, best_move, nodes = float('-inf'), None, 0
+        for move, value, searched in results:
+            nodes += searched
+            if best_move is None or value > best_value:
+                best_value, best_move = value, move
+        return SearchResult(best_value, best_move, depth, nodes, time.perf_counter() - started)
+
+
+def scaling_report(board, color, depth, worker_counts):
+    # speedup and efficiency are relative to the first worker count
+    report = []
+    for workers in worker_counts:
+        with ParallelSearch(workers) as search:
+            result = search.search(board, color, depth)
+        if not report:
+            base_elapsed, base_workers = result.elapsed, workers
+        speedup = base_elapsed / result.elapsed
+        report.append({'workers': workers, 'elapsed': result.elapsed, 'nodes': result.nodes,
+                       'speedup': speedup, 'efficiency': speedup * base_workers / workers,
+                       'move': result.move})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel root search scaling report')
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+    for line in scaling_report(Board(), WHITE, args.depth, args.workers):
+        print('{workers:3d} workers  {elapsed:8.3f}s  {nodes:10d} nodes  '
+              'speedup {speedup:5.2f}  efficiency {efficiency:5.2f}'.format(**line))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import json
+import sys
+import time
+
+from bitboard import opponent, move_name, WHITE_START, RED_START
+from board import Board
+from constants import WHITE, RED
+
+# (name, (white, red, kings), side to move, leaf counts for depth 1.., per-move
+# counts at DIVIDE_DEPTH). The counts were cross-checked against an
+# independent square-by-square generator, with only the captures taking the
+# most pieces legal.
+DIVIDE_DEPTH = 4
+POSITIONS = [
+    ('start', (WHITE_START, RED_START, 0), WHITE,
+     [7, 49, 302, 1469, 7473, 37628, 187302, 907833],
+     {'c3-b4': 244, 'e3-d4': 185, 'g3-f4': 180, 'a3-b4': 237, 'c3-d4': 184, 'e3-f4': 175, 'g3-h4': 264}),
+    ('kings', (0x20900008, 0x10000000, 0x10000008), WHITE,
+     [11, 34, 136, 320, 1520, 10034, 54430],
+     {'g3-f4': 0, 'c1-b2': 52, 'a3-b4': 0, 'g3-h4': 0, 'c1-d2': 0, 'h8-g7': 29, 'h8-f6': 66,
+      'h8-e5': 110, 'h8-d4': 21, 'h8-c3': 21, 'h8-b2': 21}),
+    ('red king', (0xd2c20204, 0x100, 0x4), RED,
+     [2, 17, 15, 178, 335, 2739, 2459, 10692],
+     {'b6-a5': 178, 'b6-c5': 0}),
+    ('middlegame', (0x8a811000, 0x206c8, 0), WHITE,
+     [7, 32, 156, 575, 2642, 10004, 45098],
+     {'g3-f4': 102, 'd2-c3': 29, 'g1-f2': 140, 'a5-b6': 174, 'b4-c5': 2, 'g3-h4': 114, 'd2-e3': 14}),
+]
+
+
+def perft(board, color, depth):
+    if depth == 0:
+        return 1
+    moves = board.get_moves(color)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    enemy = opponent(color)
+    for move in moves:
+        record = board.make_move(move)
+        nodes += perft(board, enemy, depth - 1)
+        board.unmake_move(record)
+    return nodes
+
+
+def divide(board, color, depth):
+    counts = {}
+    for move in board.get_moves(color):
+        record = board.make_move(move)
+        counts[move_name(move)] = counts.get(move_name(move), 0) + perft(board, opponent(color), depth - 1)
+        board.unmake_move(record)
+    return counts
+
+
+def load(masks):
+    board = Board()
+    board.set_masks(*masks)
+    return board
+
+
+def check(max_depth, out=sys.stdout):
+    # Returns the number of mismatches; per-move differences are printed for
+    # every position whose totals or divide counts disagree.
+    failures = 0
+    for name, masks, color, counts, expected_divide in POSITIONS:
+        board = load(masks)
+        for depth, expected in enumerate(counts[:max_depth], 1):
+            started = time.perf_counter()
+            nodes = perft(board, color, depth)
+            elapsed = time.perf_counter() - started
+            status = 'ok' if nodes == expected else 'MISMATCH (expected {})'.format(expected)
+            out.write('{:12s} depth {:2d} {:10d} nodes {:10.0f} n/s  {}\n'.format(
+                name, depth, nodes, nodes / elapsed if elapsed else 0, status))
+            if nodes != expected:
+                failures += 1
+        if DIVIDE_DEPTH <= max_depth:
+            counts = divide(board, color, DIVIDE_DEPTH)
+            for move in sorted(set(counts) | set(expected_divide)):
+                if counts.get(move) != expected_divide.get(move):
+                    failures += 1
+                    out.write('{:12s} divide {} {}: got {}, expected {}\n'.format(
+                        name, DIVIDE_DEPTH, move, counts.get(move), expected_divide.get(move)))
+    return failures
+
+
+def bench(depth, rounds=3):
+    # best nodes/second over a few rounds of the whole position suite
+    best = 0.0
+    for _ in range(rounds):
+        nodes = 0
+        started = time.perf_counter()
+        for name, masks, color, counts, expected_divide in POSITIONS:
+            nodes += perft(load(masks), color, min(depth, len(counts)))
+        best = max(best, nodes / (time.perf_counter() - started))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move generation perft check and benchmark')
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--divide', action='store_true', help='print per-move counts for the start position')
+    parser.add_argument('--bench', action='store_true', help='measure nodes/second over the suite')
+    parser.add_argument('--baseline', default='perft_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed slowdown against the baseline before failing')
+    args = parser.parse_args()
+
+    if args.divide:
+        for move, nodes in divide(Board(), WHITE, args.depth).items():
+            print(move, nodes)
+        return 0
+
+    if not args.bench:
+        failures = check(args.depth)
+        print('{} mismatches'.format(failures))
+        return 1 if failures else 0
+
+    nps = bench(args.depth)
+    print('{:.0f} nodes/s at depth {}'.format(nps, args.depth))
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'depth': args.depth, 'nps': nps}, f)
+        return 0
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        return 0
+    floor = baseline['nps'] * (1 - args.tolerance)
+    if nps < floor:
+        print('REGRESSION: {:.0f} nodes/s is below {:.0f} (baseline {:.0f})'.format(nps, floor, baseline['nps']))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import struct
+
+from bitboard import Bitboard, FULL, PROMOTION, SQUARES, squares
+from board import Board
+from constants import WHITE, RED
+from evaluation import DEFAULT_EVALUATION
+
+# white, red and king masks plus the side to move: 13 bytes
+PACKED = struct.Struct('<IIIB')
+SIDES = (WHITE, RED)
+LETTERS = {WHITE: 'W', RED: 'R'}
+
+
+class Position:
+    # Immutable snapshot of the pieces and the side to move, for cache keys,
+    # messages between processes and stored records. Board stays the mutable
+    # type the search works on.
+    __slots__ = ('white', 'red', 'kings', 'side')
+
+    def __init__(self, white, red, kings, color=WHITE):
+        set_field = object.__setattr__
+        set_field(self, 'white', white)
+        set_field(self, 'red', red)
+        set_field(self, 'kings', kings)
+        set_field(self, 'side', SIDES.index(color))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Position is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Position is immutable')
+
+    def check(self):
+        # raises ValueError unless the masks describe a position that can be
+        # set up: no square taken twice, no king without a piece and no man
+        # left on the row it would have been crowned on
+        if (self.white | self.red | self.kings) & ~FULL:
+            raise ValueError('square outside the board')
+        if self.white & self.red:
+            raise ValueError('square taken by both sides')
+        if self.kings & ~(self.white | self.red):
+            raise ValueError('king on an empty square')
+        men = ~self.kings
+        if self.white & men & PROMOTION[WHITE] or self.red & men & PROMOTION[RED]:
+            raise ValueError('man on its promotion row')
+        return self
+
+    @property
+    def color(self):
+        return SIDES[self.side]
+
+    def __eq__(self, other):
+        if not isinstance(other, Position):
+            return NotImplemented
+        return (self.white == other.white and self.red == other.red and self.kings == other.kings
+                and self.side == other.side)
+
+    def __hash__(self):
+        return hash((self.white, self.red, self.kings, self.side))
+
+    def __reduce__(self):
+        # pickles as the 13 packed bytes
+        return Position.from_bytes, (self.to_bytes(),)
+
+    def __repr__(self):
+        return "Position('{}')".format(self.fen())
+
+    @classmethod
+    def from_board(cls, board, color):
+        bits = board.bitboard
+        return cls(bits.white, bits.red, bits.kings, color)
+
+    def to_board(self, evaluation=DEFAULT_EVALUATION):
+        board = Board(evaluation)
+        board.set_masks(self.white, self.red, self.kings)
+        return board
+
+    def bitboard(self):
+        return Bitboard(self.white, self.red, self.kings)
+
+    def to_bytes(self):
+        return PACKED.pack(self.white, self.red, self.kings, self.side)
+
+    @classmethod
+    def from_bytes(cls, data, offset=0):
+        white, red, kings, side = PACKED.unpack_from(data, offset)
+        if side >= len(SIDES):
+            raise ValueError('bad side to move {}'.format(side))
+        return cls(white, red, kings, SIDES[side]).check()
+
+    def to_int(self):
+        return self.white | self.red << 32 | self.kings << 64 | self.side << 96
+
+    @classmethod
+    def from_int(cls, value):
+        mask = 0xFFFFFFFF
+        return cls(value & mask, value >> 32 & mask, value >> 64 & mask, SIDES[value >> 96 & 1]).check()
+
+    def fen(self):
+        # PDN-style text with the side to move first, then each side's
+        # squares numbered 1-32 in Bitboard order, kings prefixed with K:
+        #   W:W21,22,K30:R1,2,3
+        parts = [LETTERS[self.color]]
+        for color, mask in ((WHITE, self.white), (RED, self.red)):
+            parts.append(LETTERS[color] + ','.join(('K' if self.kings >> sq & 1 else '') + str(sq + 1)
+                                                   for sq in squares(mask)))
+        return ':'.join(parts)
+
+    @classmethod
+    def from_fen(cls, text):
+        side, *fields = text.strip().split(':')
+        colors = {letter: color for color, letter in LETTERS.items()}
+        if side not in colors or any(field[:1] not in colors for field in fields):
+            raise ValueError('bad fen {}'.format(text))
+        masks = {WHITE: 0, RED: 0}
+        kings = 0
+        for field in fields:
+            color = colors[field[0]]
+            for item in filter(None, field[1:].split(',')):
+                square = int(item[1:] if item.startswith('K') else item)
+                if not 1 <= square <= SQUARES:
+                    raise ValueError('square {} outside 1-{}'.format(square, SQUARES))
+                bit = 1 << (square - 1)
+                if (masks[WHITE] | masks[RED]) & bit:
+                    raise ValueError('square {} given twice'.format(square))
+                masks[color] |= bit
+                if item.startswith('K'):
+                    kings |= bit
+        return cls(masks[WHITE], masks[RED], kings, colors[side]).check()
@@ -0,0 +1,70 @@
+from bitboard import squares
+from constants import WHITE, RED
+
+# margin added to a capture's material gain before deciding it cannot bring
+# the score back inside the window
+DELTA_MARGIN = 50
+QNODE_LIMIT = 200000
+
+
+def capture_gain(position, move, color):
+    # evaluation value of the pieces a capture removes, plus the promotion
+    src, dst, captured, promotes = move
+    enemy = RED if color == WHITE else WHITE
+    kings = position.bitboard.kings
+    table = position.evaluation.tables[enemy]
+    gain = sum(table[kings >> sq & 1][sq] for sq in squares(captured))
+    if promotes:
+        own = position.evaluation.tables[color]
+        gain += own[1][dst] - own[0][src]
+    return gain
+
+
+def quiescence(position, alpha, beta, to_max, color, context):
+    # Follows capture sequences from a depth-0 node until the side to move
+    # has no capture. Captures are compulsory, so a side that can capture may
+    # not stand pat: the static score is only returned for quiet positions,
+    # and otherwise bounds the capture gains for delta pruning.
+    context.visit()
+    ai_color = RED if color == WHITE else WHITE
+    stand_pat = position.evaluate(ai_color)
+    if __debug__:
+        if context.stats is not None:
+            context.stats.qnodes += 1
+    side = ai_color if to_max else color
+    if context.qnodes >= context.qnode_limit or position.winner() is not None:
+        return stand_pat
+    captures = position.bitboard.get_captures(side)
+    if not captures:
+        if __debug__:
+            if context.stats is not None:
+                context.stats.leaves += 1
+        return stand_pat
+    context.qnodes += 1
+
+    captures.sort(key=lambda move: move[2].bit_count(), reverse=True)
+    best = float('-inf') if to_max else float('inf')
+    for move in captures:
+        gain = capture_gain(position, move, side) + DELTA_MARGIN
+        if to_max:
+            if stand_pat + gain <= alpha:
+                # delta pruning: even this gain leaves the score below alpha
+                best = max(best, stand_pat + gain)
+                continue
+        elif stand_pat - gain >= beta:
+            best = min(best, stand_pat - gain)
+            continue
+        record = position.make_move(move)
+        context.ply += 1
+        value = quiescence(position, alpha, beta, not to_max, color, context)
+        context.ply -= 1
+        position.unmake_move(record)
+        if to_max:
+            best = max(best, value)
+            alpha = max(alpha, value)
+        else:
+            best = min(best, value)
+            beta = min(beta, value)
+        if beta <= alpha:
+            break
+    return best
@@ -0,0 +1,142 @@
+import time
+
+from alpha_beta import alpha_beta
+from bitboard import opponent
+from context import SearchContext, SearchTimeout
+from minimax import minimax
+from ordering import MoveOrdering
+from stats import SearchStats
+from tablebase import best_move as tablebase_move, score as tablebase_score
+from transposition import TranspositionTable
+
+MAX_DEPTH = 64
+# an aspiration window that fails this many times falls back to a full window
+ASPIRATION_TRIES = 3
+
+
+class SearchResult:
+    def __init__(self, value=None, move=None, depth=0, nodes=0, elapsed=0.0, pv=(), stats=None):
+        self.value = value
+        self.move = move
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.pv = pv
+        self.stats = stats
+
+    def __repr__(self):
+        return 'SearchResult(value={}, move={}, depth={}, nodes={}, elapsed={:.3f})'.format(
+            self.value, self.move, self.depth, self.nodes, self.elapsed)
+
+
+def principal_variation(board, color, tt, depth):
+    # Walk the best moves stored in the table from the root; returns
+    # [(key, move), ...] for the side to move at each step.
+    line = []
+    position = board.copy()
+    seen = set()
+    for _ in range(depth):
+        key = position.key(color)
+        entry = tt.probe(key)
+        if entry is None or entry[3] is None or key in seen or entry[3] not in position.get_moves(color):
+            break
+        seen.add(key)
+        line.append((key, entry[3]))
+        position.make_move(entry[3])
+        color = opponent(color)
+    return line
+
+
+def iterative_deepening(board, color, use_minimax=False, time_limit=None, node_limit=None,
+                        max_depth=MAX_DEPTH, tt=None, ordering=None, debug_hook=None, evaluation=None,
+                        batch=False, tablebase=None, book=None, quiescence=False, pvs=False, aspiration=None,
+                        stop=None, progress=None):
+    # color is the side the engine plays against, as in minimax/alpha_beta.
+    # Deepens one ply at a time until the time or node budget runs out and
+    # returns the result of the last iteration that finished. With
+    # aspiration set, alpha-beta iterations start from a window that wide
+    # either side of the previous score and widen it on a fail. Setting the
+    # stop event ends the search early; progress(result) is called after
+    # every completed iteration.
+    if tt is None:
+        tt = TranspositionTable()
+    tt.new_search()
+    if ordering is None:
+        ordering = MoveOrdering()
+    ordering.new_search()
+    stats = SearchStats() if __debug__ else None
+    context = SearchContext(tt, time_limit, node_limit, ordering, debug_hook, batch, tablebase, stats, quiescence,
+                            pvs=pvs, stop=stop)
+    context.start()
+    started = time.perf_counter()
+    ai_color = opponent(color)
+    result = SearchResult()
+
+    moves = board.get_moves(ai_color)
+    if len(moves) <= 1:
+        result.move = moves[0] if moves else None
+        return result
+
+    if book is not None:
+        move = book.choose(board, ai_color)
+        if move is not None:
+            result.move = move
+            result.elapsed = time.perf_counter() - started
+            return result
+
+    if tablebase is not None and tablebase.covers(board.bitboard):
+        found = tablebase_move(tablebase, board.bitboard, ai_color)
+        if found is not None:
+            move, (outcome, distance) = found
+            # the reply's outcome is from the opponent's side
+            result.value = tablebase_score((outcome, distance), False, 1)
+            result.move = move
+            result.elapsed = time.perf_counter() - started
+            return result
+
+    position = board.copy()
+    if evaluation is not None:
+        position.set_evaluation(evaluation)
+    for depth in range(1, max_depth + 1):
+        try:
+            if use_minimax:
+                value, move = minimax(position, depth, True, color, context)
+            elif aspiration and result.value is not None and abs(result.value) != float('inf'):
+                value, move = aspiration_search(position, depth, color, context, result.value, aspiration)
+            else:
+                value, move = alpha_beta(position, depth, float('-inf'), float('inf'), True, color, context)
+        except SearchTimeout:
+            break
+        line = principal_variation(board, ai_color, tt, depth)
+        context.pv = dict(line)
+        result = SearchResult(value, move, depth, context.nodes, time.perf_counter() - started,
+                              tuple(move for key, move in line))
+        if __debug__:
+            stats.iteration(depth, context.nodes)
+        if progress is not None:
+            progress(result)
+        if abs(value) == float('inf'):
+            break
+    if result.move is None:
+        result.move = moves[0]
+    result.nodes = context.nodes
+    result.elapsed = time.perf_counter() - started
+    if __debug__:
+        stats.finish()
+        result.stats = stats
+    return result
+
+
+def aspiration_search(position, depth, color, context, previous, window):
+    alpha, beta = previous - window, previous + window
+    for _ in range(ASPIRATION_TRIES):
+        value, move = alpha_beta(position, depth, alpha, beta, True, color, context)
+        if value <= alpha:
+            window *= 4
+            alpha = previous - window
+        elif value >= beta:
+            window *= 4
+            beta = previous + window
+        else:
+            return value, move
+    return alpha_beta(position, depth, float('-inf'), float('inf'), True, color, context)
@@ -0,0 +1,77 @@
+import argparse
+import time
+
+from bitboard import opponent
+from position import Position
+from search import iterative_deepening
+from transposition import TranspositionTable
+
+# fixed suite: the start position, quiet positions from seeded random games
+# and endings where one side is soon left without a move
+SUITE = (
+    'W:W21,22,23,24,25,26,27,28,29,30,31,32:R1,2,3,4,5,6,7,8,9,10,11,12',
+    'W:W20,21,22,23,26,27,28,29,30,31,32:R1,2,3,4,5,8,11,12,15',
+    'W:W21,24,26,28,30,31,32:R1,2,3,5,6,7,11,K29',
+    'W:W11,23,24,26,27,29,30,31,32:R1,2,3,4,5,10,12,13,17',
+    'W:W9,17,21,23,25,28,29,30,32:R1,2,3,7,8,12,15',
+    'W:W17,26,28,30,31,32:R1,2,6,8,9,10,19',
+    'W:W21,27,28,29,30,31,32:R1,2,3,4,5,6,7,8,11,19',
+    'W:W17,18,19,22,24,25,28,29,30,31,32:R2,3,4,5,6,7,8,10,11,12,13',
+    'W:W24,26,27,28,32:R1,4,8,11,12,21',
+    # positions where a side runs out of moves early in the tree, so a null
+    # window would have to be set around an infinite bound
+    'R:WK31,5:RK15,K13',
+    'R:WK1,5:R14,K24',
+    'W:WK4,25:RK17,K29',
+)
+
+# iterative_deepening options for each compared variant
+MODES = {
+    'alpha_beta': {},
+    'pvs': {'pvs': True},
+    'pvs+aspiration': {'pvs': True, 'aspiration': 50},
+}
+
+DEPTH = 7
+TT_SIZE_MB = 16
+
+
+def run(depth=DEPTH, modes=tuple(MODES)):
+    # Searches every suite position to a fixed depth with each mode, each run
+    # with a fresh table; returns {mode: [(nodes, seconds, value), ...]}.
+    results = {mode: [] for mode in modes}
+    for fen in SUITE:
+        position = Position.from_fen(fen)
+        board = position.to_board()
+        for mode in modes:
+            started = time.perf_counter()
+            result = iterative_deepening(board, opponent(position.color), max_depth=depth,
+                                         tt=TranspositionTable(TT_SIZE_MB), **MODES[mode])
+            results[mode].append((result.nodes, time.perf_counter() - started, result.value))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare node counts of the alpha-beta variants')
+    parser.add_argument('--depth', type=int, default=DEPTH)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+    results = run(args.depth, args.modes)
+    base = args.modes[0]
+    print('{:>3}  '.format('#') + ''.join('{:>24}'.format(mode) for mode in args.modes))
+    for i in range(len(SUITE)):
+        print('{:>3}  '.format(i) + ''.join('{:>14} ({:>7})'.format(results[mode][i][0], results[mode][i][2])
+                                           for mode in args.modes))
+    base_nodes = sum(nodes for nodes, seconds, value in results[base])
+    for mode in args.modes:
+        nodes = sum(nodes for nodes, seconds, value in results[mode])
+        seconds = sum(seconds for nodes, seconds, value in results[mode])
+        # besides real bugs, a mismatch can come from the modes reusing
+        # different table entries that were searched deeper than needed
+        mismatches = sum(a[2] != b[2] for a, b in zip(results[mode], results[base]))
+        print('{:<16} {:>10} nodes  {:6.2f}s  {:6.1%} of {}  {} value mismatches'.format(
+            mode, nodes, seconds, nodes / base_nodes if base_nodes else 0.0, base, mismatches))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from bitboard import opponent, move_name
+from board import Board
+from constants import WHITE
+from ordering import MoveOrdering
+from position import Position
+from search import MAX_DEPTH, iterative_deepening
+from transposition import TranspositionTable
+
+# Line protocol, one command per line:
+#   newgame                       forget the session's tables, back to the start
+#   position startpos [moves ..]  set the position, moves as c3-d4 / e3:g5
+#   position fen <fen> [moves ..]
+#   go [movetime ms] [depth n] [nodes n]
+#                                 limits combine; movetime 1000 without any
+#   stop                          end the running search early
+#   isready                       answered with readyok
+#   fen                           answered with fen <current position>
+#   quit
+# A search reports "info depth .. score .. nodes .. pv .." after every
+# iteration and ends with "bestmove <move>" ("bestmove none" without a legal
+# move). Problems are answered with "error <reason>".
+
+DEFAULT_PORT = 7878
+DEFAULT_MOVETIME = 1000
+SESSION_TT_MB = 4
+WORKER_TT_MB = 64
+# searches queued or running across all sessions before "go" is refused
+MAX_PENDING = 64
+# recently cancelled job ids remembered per worker
+CANCEL_SLOTS = 64
+
+# Worker process state, set up once per process by _init_worker.
+_cancel = None
+_updates = None
+_sessions = None
+_max_sessions = 1
+
+
+class _JobStop:
+    # Stop flag for one job: the server cancels a job by writing its id into
+    # the worker's shared ring of cancelled ids.
+    def __init__(self, cancel, job_id):
+        self.cancel = cancel
+        self.job_id = job_id
+
+    def is_set(self):
+        return self.job_id in self.cancel[:]
+
+
+def _init_worker(cancel, updates, worker_tt_mb):
+    global _cancel, _updates, _sessions, _max_sessions
+    _cancel = cancel
+    _updates = updates
+    # least recently used sessions give up their tables first
+    _sessions = OrderedDict()
+    _max_sessions = max(1, worker_tt_mb // SESSION_TT_MB)
+
+
+def _session_state(session_id, color):
+    # Each session keeps its own tables and history per engine colour, since a
+    # table's scores are from one side's point of view.
+    state = _sessions.pop(session_id, None) or {}
+    _sessions[session_id] = state
+    while len(_sessions) > _max_sessions:
+        _sessions.popitem(last=False)
+    if color not in state:
+        state[color] = (TranspositionTable(SESSION_TT_MB / 2), MoveOrdering())
+    return state[color]
+
+
+def _forget(session_id):
+    _sessions.pop(session_id, None)
+
+
+def _go(session_id, job_id, data, history, options, deadline):
+    position = Position.from_bytes(data)
+    board = position.to_board()
+    board.set_history(*history)
+    tt, ordering = _session_state(session_id, position.color)
+    # time spent waiting in the queue counts against the request's deadline
+    options = dict(options)
+    if deadline is not None:
+        options['time_limit'] = max(deadline - time.time(), 0.01)
+
+    def progress(result):
+        _updates.put((job_id, result.depth, result.value, result.nodes, result.pv))
+
+    result = iterative_deepening(board, opponent(position.color), tt=tt, ordering=ordering,
+                                 stop=_JobStop(_cancel, job_id), progress=progress, **options)
+    return result.move
+
+
+def parse_fen(text):
+    # (position, board); the board is set up here too, so a position that
+    # parses but cannot be placed is refused the same way
+    try:
+        position = Position.from_fen(text)
+        return position, position.to_board()
+    except (ValueError, KeyError, IndexError):
+        raise ValueError('bad fen {}'.format(text))
+
+
+def parse_moves(board, color, names):
+    # plays the named moves on board; either separator is accepted
+    for name in names:
+        legal = {move_name(move).replace(':', '-'): move for move in board.get_moves(color)}
+        move = legal.get(name.replace(':', '-'))
+        if move is None:
+            raise ValueError('illegal move {}'.format(name))
+        board.make_move(move)
+        color = opponent(color)
+    return color
+
+
+class Session:
+    def __init__(self, server, session_id, writer):
+        self.server = server
+        self.id = session_id
+        self.writer = writer
+        self.worker = session_id % len(server.workers)
+        self.position = Position.from_board(Board(), WHITE)
+        # repeatable tail of the moves played to reach position
+        self.history = ([], 0)
+        self.job_id = None
+
+    def send(self, line):
+        self.writer.write((line + '\n').encode())
+
+    async def handle(self, line):
+        command, *args = line.split()
+        if command == 'isready':
+            self.send('readyok')
+        elif command == 'newgame':
+            self.stop()
+            self.position = Position.from_board(Board(), WHITE)
+            self.history = ([], 0)
+            self.server.workers[self.worker].submit(_forget, self.id)
+        elif command == 'position':
+            self.set_position(args)
+        elif command == 'fen':
+            self.send('fen ' + self.position.fen())
+        elif command == 'go':
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        else:
+            self.send('error unknown command {}'.format(command))
+        await self.writer.drain()
+
+    def set_position(self, args):
+        if self.job_id is not None:
+            self.send('error search in progress')
+            return
+        moves = []
+        if 'moves' in args:
+            moves = args[args.index('moves') + 1:]
+            args = args[:args.index('moves')]
+        try:
+            if args[:1] == ['startpos']:
+                board, color = Board(), WHITE
+            elif args[:1] == ['fen'] and len(args) == 2:
+                position, board = parse_fen(args[1])
+                color = position.color
+            else:
+                raise ValueError('expected startpos or fen <fen>')
+            color = parse_moves(board, color, moves)
+        except ValueError as e:
+            self.send('error {}'.format(e))
+            return
+        self.position = Position.from_board(board, color)
+        self.history = (board.recent_history(), board.quiet_plies)
+
+    def go(self, args):
+        if self.job_id is not None:
+            self.send('error search in progress')
+            return
+        if self.server.pending >= self.server.max_pending:
+            self.send('error overloaded')
+            return
+        limits = dict(zip(args[::2], args[1::2]))
+        try:
+            options = dict(self.server.options)
+            if 'depth' in limits:
+                options['max_depth'] = int(limits['depth'])
+                # the search's per-ply tables are sized for MAX_DEPTH
+                if not 1 <= options['max_depth'] <= MAX_DEPTH:
+                    raise ValueError('depth must be 1-{}'.format(MAX_DEPTH))
+            if 'nodes' in limits:
+                options['node_limit'] = int(limits['nodes'])
+            # a depth or node limit alone searches until it is reached; the
+            # default move time applies only when no limit is given
+            movetime = limits.get('movetime')
+            if movetime is None and not ('depth' in limits or 'nodes' in limits):
+                movetime = DEFAULT_MOVETIME
+            deadline = time.time() + int(movetime) / 1000 if movetime is not None else None
+        except ValueError as e:
+            self.send('error {}'.format(e))
+            return
+        self.job_id = job_id = next(self.server.job_ids)
+        self.server.jobs[job_id] = self
+        self.server.pending += 1
+        worker = self.server.workers[self.worker]
+        future = worker.submit(_go, self.id, job_id, self.position.to_bytes(), self.history, options, deadline)
+        asyncio.ensure_future(self.finish(job_id, asyncio.wrap_future(future)))
+
+    async def finish(self, job_id, future):
+        try:
+            move = await future
+            self.send('bestmove ' + (move_name(move) if move is not None else 'none'))
+        except Exception as e:
+            self.send('error search failed: {}'.format(e))
+        finally:
+            self.server.pending -= 1
+            self.server.jobs.pop(job_id, None)
+            if self.job_id == job_id:
+                self.job_id = None
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+    def info(self, depth, value, nodes, pv):
+        self.send('info depth {} score {} nodes {} pv {}'.format(depth, value, nodes,
+                                                                 ' '.join(move_name(move) for move in pv)).rstrip())
+
+    def stop(self):
+        if self.job_id is not None:
+            self.server.cancel(self.worker, self.job_id)
+
+
+class EngineServer:
+    # Sessions are pinned to one of the worker processes, so their tables
+    # stay in one place; a session runs one search at a time.
+    def __init__(self, workers=None, worker_tt_mb=WORKER_TT_MB, max_pending=MAX_PENDING, **options):
+        self.options = options
+        self.max_pending = max_pending
+        self.pending = 0
+        self.jobs = {}
+        self.job_ids = itertools.count()
+        self.session_ids = itertools.count()
+        self.updates = multiprocessing.Queue()
+        self.cancels = []
+        self.cancelled = []
+        self.workers = []
+        for _ in range(workers or os.cpu_count() or 1):
+            cancel = multiprocessing.RawArray('q', [-1] * CANCEL_SLOTS)
+            self.cancels.append(cancel)
+            self.cancelled.append(0)
+            self.workers.append(ProcessPoolExecutor(1, initializer=_init_worker,
+                                                    initargs=(cancel, self.updates, worker_tt_mb)))
+        self.loop = None
+
+    def cancel(self, worker, job_id):
+        self.cancels[worker][self.cancelled[worker] % CANCEL_SLOTS] = job_id
+        self.cancelled[worker] += 1
+
+    def _pump(self):
+        # hands progress reports from the workers to the event loop
+        while True:
+            item = self.updates.get()
+            if item is None:
+                return
+            self.loop.call_soon_threadsafe(self._info, item)
+
+    def _info(self, item):
+        job_id, depth, value, nodes, pv = item
+        session = self.jobs.get(job_id)
+        if session is not None and session.job_id == job_id:
+            session.info(depth, value, nodes, pv)
+
+    async def handle_client(self, reader, writer):
+        session = Session(self, next(self.session_ids), writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line or line.strip() == b'quit':
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    await session.handle(line.decode().strip())
+                except ConnectionError:
+                    raise
+                except Exception as e:
+                    # one bad command costs the client an error line, not the session
+                    session.send('error {}: {}'.format(type(e).__name__, e))
+        except ConnectionError:
+            pass
+        finally:
+            session.stop()
+            self.workers[session.worker].submit(_forget, session.id)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT, path=None):
+        self.loop = asyncio.get_running_loop()
+        threading.Thread(target=self._pump, daemon=True).start()
+        if path:
+            server = await asyncio.start_unix_server(self.handle_client, path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.updates.put(None)
+        for worker in self.workers:
+            worker.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checkers engine server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', help='listen on a Unix socket at this path instead')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--worker-tt-mb', type=int, default=WORKER_TT_MB)
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING)
+    args = parser.parse_args()
+    server = EngineServer(args.workers, args.worker_tt_mb, args.max_pending, pvs=True, quiescence=True,
+                          aspiration=50)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
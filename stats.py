@@ -0,0 +1,101 @@
+import json
+import os
+import time
+
+from ordering import MAX_PLY
+
+# Collection sits behind `if __debug__:` blocks in the search, which the
+# compiler drops under `python -O`; iterative_deepening then creates no
+# stats object at all.
+
+
+class SearchStats:
+    # Counters for one iterative_deepening call. Per-ply counters are indexed
+    # by distance from the root, iterations are (depth, nodes, seconds) for
+    # each completed depth.
+    def __init__(self):
+        self.nodes = [0] * MAX_PLY
+        self.leaves = 0
+        self.qnodes = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.iterations = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._last_nodes = 0
+        self._last_time = self.started
+
+    def cutoff(self, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_cutoffs += 1
+
+    def probe(self, entry):
+        self.tt_probes += 1
+        if entry is not None:
+            self.tt_hits += 1
+
+    def iteration(self, depth, nodes):
+        now = time.perf_counter()
+        self.iterations.append((depth, nodes - self._last_nodes, now - self._last_time))
+        self._last_nodes, self._last_time = nodes, now
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    def total_nodes(self):
+        return sum(self.nodes)
+
+    def branching_factor(self):
+        # effective branching factor: growth in nodes between the last two
+        # completed iterations
+        if len(self.iterations) < 2 or not self.iterations[-2][1]:
+            return 0.0
+        return self.iterations[-1][1] / self.iterations[-2][1]
+
+    def as_dict(self):
+        nodes = self.total_nodes()
+        return {
+            'nodes': nodes,
+            'nodes_per_ply': self.nodes[:max((ply + 1 for ply in range(MAX_PLY) if self.nodes[ply]), default=0)],
+            'leaves': self.leaves,
+            'qnodes': self.qnodes,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': self.first_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            'tt_probes': self.tt_probes,
+            'tt_hits': self.tt_hits,
+            'branching_factor': self.branching_factor(),
+            'iterations': [{'depth': depth, 'nodes': count, 'seconds': seconds}
+                           for depth, count, seconds in self.iterations],
+            'seconds': self.elapsed,
+            'nps': nodes / self.elapsed if self.elapsed else 0.0,
+        }
+
+    def write_json(self, path, **extra):
+        # one JSON object per search, appended
+        with open(path, 'a') as f:
+            f.write(json.dumps(dict(self.as_dict(), **extra)) + '\n')
+
+    def write_prometheus(self, path, prefix='checkers_search'):
+        # Text exposition format for a node-exporter textfile collector; the
+        # file is replaced in one step so a scrape never sees half of it.
+        data = self.as_dict()
+        lines = []
+        for name in ('nodes', 'leaves', 'qnodes', 'cutoffs', 'tt_probes', 'tt_hits'):
+            lines.append('# TYPE {}_{} gauge'.format(prefix, name))
+            lines.append('{}_{} {}'.format(prefix, name, data[name]))
+        for name in ('first_move_cutoff_rate', 'branching_factor', 'seconds', 'nps'):
+            lines.append('# TYPE {}_{} gauge'.format(prefix, name))
+            lines.append('{}_{} {:.6f}'.format(prefix, name, data[name]))
+        lines.append('# TYPE {}_iteration_nodes gauge'.format(prefix))
+        for item in data['iterations']:
+            lines.append('{}_iteration_nodes{{depth="{}"}} {}'.format(prefix, item['depth'], item['nodes']))
+        lines.append('# TYPE {}_iteration_seconds gauge'.format(prefix))
+        for item in data['iterations']:
+            lines.append('{}_iteration_seconds{{depth="{}"}} {:.6f}'.format(prefix, item['depth'], item['seconds']))
+        temp = path + '.tmp'
+        with open(temp, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp, path)
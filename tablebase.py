@@ -0,0 +1,344 @@
+import argparse
+import mmap
+import struct
+import time
+from array import array
+from itertools import combinations
+
+from bitboard import Bitboard, SQUARES, TOP_ROW, BOTTOM_ROW, squares
+from constants import WHITE, RED
+from evaluation import WIN_SCORE
+
+# Entry values, one byte per position and side to move; distances are in
+# plies until the game ends with best play.
+DRAW = 0
+INVALID = 1
+MAX_DISTANCE = 126
+
+WIN, LOSS = 'win', 'loss'
+
+MAGIC = b'CKTB'
+# 2: only the captures taking the most pieces are legal
+VERSION = 2
+HEADER = struct.Struct('<4sHHI')
+ENTRY = struct.Struct('<BBBBQQ')
+
+DEFAULT_PIECES = 4
+
+
+def win_value(distance):
+    return 2 + 2 * min(distance, MAX_DISTANCE)
+
+
+def loss_value(distance):
+    return 3 + 2 * min(distance, MAX_DISTANCE)
+
+
+def decode(value):
+    if value == DRAW:
+        return DRAW, 0
+    if value == INVALID:
+        return None
+    if value % 2 == 0:
+        return WIN, (value - 2) // 2
+    return LOSS, (value - 3) // 2
+
+
+# Squares of a k-piece set are ranked with the combinatorial number system:
+# rank = C(s1, 1) + C(s2, 2) + ... for s1 < s2 < ...
+BINOMIAL = [[0] * (DEFAULT_PIECES * 2 + 2) for _ in range(SQUARES + 1)]
+for _n in range(SQUARES + 1):
+    BINOMIAL[_n][0] = 1
+    for _k in range(1, len(BINOMIAL[_n])):
+        BINOMIAL[_n][_k] = BINOMIAL[_n - 1][_k - 1] + BINOMIAL[_n - 1][_k] if _n else 0
+
+
+def rank(mask):
+    total = 0
+    for i, sq in enumerate(squares(mask), 1):
+        total += BINOMIAL[sq][i]
+    return total
+
+
+def masks_by_rank(k):
+    masks = [0] * BINOMIAL[SQUARES][k]
+    for combo in combinations(range(SQUARES), k):
+        mask = 0
+        for sq in combo:
+            mask |= 1 << sq
+        masks[rank(mask)] = mask
+    return masks
+
+
+def signature(bits):
+    return ((bits.white & ~bits.kings).bit_count(), (bits.white & bits.kings).bit_count(),
+            (bits.red & ~bits.kings).bit_count(), (bits.red & bits.kings).bit_count())
+
+
+def sizes(sig):
+    return [BINOMIAL[SQUARES][count] for count in sig]
+
+
+def index(bits, color, sig=None):
+    sig = sig or signature(bits)
+    layers = (bits.white & ~bits.kings, bits.white & bits.kings,
+              bits.red & ~bits.kings, bits.red & bits.kings)
+    total = 0
+    for mask, size in zip(layers, sizes(sig)):
+        total = total * size + rank(mask)
+    return total * 2 + (0 if color == WHITE else 1)
+
+
+def signatures(max_pieces):
+    # Every child of a position is either in the same signature or in one
+    # listed earlier: captures lower the piece count and promotions turn a
+    # man into a king.
+    found = []
+    for total in range(2, max_pieces + 1):
+        for white in range(1, total):
+            red = total - white
+            for wk in range(white + 1):
+                for rk in range(red + 1):
+                    found.append((white - wk, wk, red - rk, rk))
+    found.sort(key=lambda sig: (sum(sig), sig[0] + sig[2]))
+    return found
+
+
+class TablebaseWriter:
+    def __init__(self, max_pieces=DEFAULT_PIECES, log=None):
+        self.max_pieces = max_pieces
+        self.tables = {}
+        self.log = log
+
+    def value(self, bits, color):
+        if not bits.white or not bits.red:
+            # the side to move has no pieces left
+            return loss_value(0)
+        sig = signature(bits)
+        return self.tables[sig][index(bits, color, sig)]
+
+    def generate(self):
+        for sig in signatures(self.max_pieces):
+            started = time.perf_counter()
+            self.tables[sig] = self._solve(sig)
+            if self.log:
+                self.log('{} solved in {:.1f}s'.format(sig, time.perf_counter() - started))
+        return self.tables
+
+    def _solve(self, sig):
+        layer_masks = [masks_by_rank(count) for count in sig]
+        values = bytearray([INVALID]) * (2 * len(layer_masks[0]) * len(layer_masks[1])
+                                         * len(layer_masks[2]) * len(layer_masks[3]))
+        # for each unresolved position: (position index, in-signature child
+        # indices, best child value found outside this signature)
+        pending = []
+        position = 0
+        for wm in layer_masks[0]:
+            for wk in layer_masks[1]:
+                for rm in layer_masks[2]:
+                    for rk in layer_masks[3]:
+                        valid = not (wm & wk or (wm | wk) & (rm | rk) or rm & rk
+                                     or wm & TOP_ROW or rm & BOTTOM_ROW)
+                        if valid:
+                            bits = Bitboard(wm | wk, rm | rk, wk | rk)
+                            for side, color in ((0, WHITE), (1, RED)):
+                                self._expand(bits, color, position + side, sig, values, pending)
+                        position += 2
+
+        # Settle positions one distance level at a time: level n only
+        # assigns wins and losses in exactly n plies, so every distance is the
+        # shortest one and later passes cannot improve on it.
+        horizon = 0
+        for position, inner, outside in pending:
+            for value in outside:
+                if value > INVALID:
+                    horizon = max(horizon, (value - 2) // 2)
+        level = 1
+        while pending:
+            still_pending = []
+            settled = []
+            for entry in pending:
+                position, inner, outside = entry
+                value = _settle([values[child] for child in inner] + outside, level)
+                if value is None:
+                    still_pending.append(entry)
+                else:
+                    settled.append((position, value))
+            for position, value in settled:
+                values[position] = value
+            pending = still_pending
+            if not settled and level > horizon + 1:
+                break
+            level += 1
+        for position, inner, outside in pending:
+            values[position] = DRAW
+        return values
+
+    def _expand(self, bits, color, position, sig, values, pending):
+        moves = bits.get_moves(color)
+        if not moves:
+            values[position] = loss_value(0)
+            return
+        other = RED if color == WHITE else WHITE
+        inner = array('I')
+        outside = []
+        for move in moves:
+            child = bits.copy()
+            child.apply(color, move)
+            child_sig = signature(child)
+            if child_sig == sig:
+                inner.append(index(child, other, sig))
+            else:
+                outside.append(self.value(child, other))
+        value = None if inner else _combine(outside)
+        if value is None:
+            pending.append((position, inner, outside))
+        else:
+            values[position] = value
+
+    def write(self, path):
+        directory = []
+        offset = HEADER.size + ENTRY.size * len(self.tables)
+        for sig, values in self.tables.items():
+            directory.append((sig, offset, len(values)))
+            offset += len(values)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.max_pieces, len(directory)))
+            for sig, offset, length in directory:
+                f.write(ENTRY.pack(*sig, offset, length))
+            for sig, values in self.tables.items():
+                f.write(values)
+
+
+def _settle(child_values, level):
+    # Like _combine, but only returns a win or loss in exactly `level` plies.
+    best_win = None
+    worst_loss = 0
+    all_won = True
+    for value in child_values:
+        if value == INVALID or value == DRAW:
+            all_won = False
+        elif value % 2:
+            distance = (value - 3) // 2
+            if best_win is None or distance < best_win:
+                best_win = distance
+        else:
+            worst_loss = max(worst_loss, (value - 2) // 2)
+    if best_win is not None:
+        return win_value(level) if best_win + 1 == level else None
+    if all_won and worst_loss + 1 == level:
+        return loss_value(level)
+    return None
+
+
+def _combine(child_values):
+    # Value for the side to move from its children's values, or None while
+    # any child that could matter is still unresolved. Child values are from
+    # the opponent's point of view.
+    best_win = None
+    worst_loss = 0
+    undecided = False
+    for value in child_values:
+        if value == INVALID:
+            undecided = True
+        elif value == DRAW:
+            undecided = True
+        elif value % 2:
+            distance = (value - 3) // 2
+            if best_win is None or distance < best_win:
+                best_win = distance
+        else:
+            worst_loss = max(worst_loss, (value - 2) // 2)
+    if best_win is not None:
+        return win_value(best_win + 1)
+    if undecided:
+        return None
+    return loss_value(worst_loss + 1)
+
+
+class Tablebase:
+    # Read-only view over a generated file. The file is memory-mapped, so
+    # opening it costs no load time and several processes probing the same
+    # file share its pages.
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_pieces, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} tablebase'.format(path, VERSION))
+        self.tables = {}
+        for i in range(count):
+            wm, wk, rm, rk, offset, length = ENTRY.unpack_from(self.data, HEADER.size + i * ENTRY.size)
+            self.tables[(wm, wk, rm, rk)] = (offset, length)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def covers(self, bits):
+        return (bits.white | bits.red).bit_count() <= self.max_pieces
+
+    def probe(self, bits, color):
+        # (WIN/LOSS/DRAW, distance) for the side to move, or None when the
+        # position is outside the tables
+        sig = signature(bits)
+        table = self.tables.get(sig)
+        if table is None:
+            return None
+        offset, length = table
+        return decode(self.data[offset + index(bits, color, sig)])
+
+
+def score(result, engine_to_move, ply):
+    # Search score for a probe result: result is from the side to move's
+    # point of view, the score from the engine's. Quicker wins and slower
+    # losses score higher.
+    outcome, distance = result
+    if outcome == DRAW:
+        return 0
+    value = WIN_SCORE - ply - distance
+    return value if (outcome == WIN) == engine_to_move else -value
+
+
+def best_move(tablebase, bits, color):
+    # Picks the move with the best tablebase outcome for the side to move,
+    # or returns None when some reply is not covered by the tables.
+    best, best_key = None, None
+    other = RED if color == WHITE else WHITE
+    for move in bits.get_moves(color):
+        child = bits.copy()
+        child.apply(color, move)
+        if not child.white or not child.red:
+            result = (LOSS, 0)
+        else:
+            result = tablebase.probe(child, other)
+            if result is None:
+                return None
+        outcome, distance = result
+        # from the mover's side: opponent losses first (quickest), then
+        # draws, then opponent wins (slowest)
+        if outcome == LOSS:
+            key = (2, -distance)
+        elif outcome == DRAW:
+            key = (1, 0)
+        else:
+            key = (0, distance)
+        if best_key is None or key > best_key:
+            best, best_key = (move, result), key
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate an endgame tablebase')
+    parser.add_argument('--pieces', type=int, default=DEFAULT_PIECES)
+    parser.add_argument('--out', default='tablebase.bin')
+    args = parser.parse_args()
+    if args.pieces > DEFAULT_PIECES * 2:
+        parser.error('at most {} pieces are supported'.format(DEFAULT_PIECES * 2))
+    writer = TablebaseWriter(args.pieces, log=print)
+    writer.generate()
+    writer.write(args.out)
+
+
+if __name__ == '__main__':
+    main()
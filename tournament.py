@@ -0,0 +1,192 @@
+import argparse
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bitboard import opponent
+from board import Board
+from constants import WHITE, RED
+from evaluation import Evaluation, DEFAULT_WEIGHTS, load_weights
+from gamedb import GameLog, encode_move
+from position import Position
+from search import iterative_deepening
+from transposition import TranspositionTable
+
+MAX_PLIES = 200
+OPENING_PLIES = 4
+
+
+def parse_engine(spec):
+    # "algorithm=alpha_beta,depth=5" or "algorithm=minimax,time_limit=0.5";
+    # evaluation weights can be overridden too, e.g. "king=250,centre=10",
+    # on top of a tuned weights file given as "weights_file=weights.json"
+    config = {'algorithm': 'alpha_beta', 'depth': 4, 'time_limit': None, 'node_limit': None, 'tt_size_mb': 8,
+              'quiescence': False, 'pvs': False, 'aspiration': None, 'weights_file': None,
+              'weights': {}}
+    for item in filter(None, spec.split(',')):
+        key, value = item.split('=', 1)
+        if key in DEFAULT_WEIGHTS:
+            config['weights'][key] = int(value)
+            continue
+        if key not in config and key != 'name':
+            raise ValueError('unknown engine option: {}'.format(key))
+        if key in ('depth', 'node_limit', 'tt_size_mb', 'aspiration'):
+            value = int(value)
+        elif key == 'time_limit':
+            value = float(value)
+        elif key in ('quiescence', 'pvs'):
+            value = value.lower() in ('1', 'true', 'yes')
+        config[key] = value
+    if config['algorithm'] not in ('alpha_beta', 'minimax'):
+        raise ValueError('unknown algorithm: {}'.format(config['algorithm']))
+    config.setdefault('name', spec)
+    return config
+
+
+class Player:
+    def __init__(self, config):
+        self.config = config
+        self.tt = TranspositionTable(config['tt_size_mb'])
+        weights = dict(config['weights'])
+        if config['weights_file']:
+            weights = dict(load_weights(config['weights_file']).weights, **weights)
+        self.evaluation = Evaluation(weights) if weights else None
+        self.nodes = 0
+        self.moves = 0
+        self.elapsed = 0.0
+
+    def choose(self, board, color):
+        config = self.config
+        result = iterative_deepening(board, opponent(color), use_minimax=config['algorithm'] == 'minimax',
+                                     time_limit=config['time_limit'], node_limit=config['node_limit'],
+                                     max_depth=config['depth'], tt=self.tt, evaluation=self.evaluation,
+                                     quiescence=config['quiescence'], pvs=config['pvs'],
+                                     aspiration=config['aspiration'])
+        self.nodes += result.nodes
+        self.moves += 1
+        self.elapsed += result.elapsed
+        return result.move
+
+    def summary(self):
+        return {'nodes': self.nodes, 'moves': self.moves,
+                'nps': self.nodes / self.elapsed if self.elapsed else 0.0,
+                'avg_move_time': self.elapsed / self.moves if self.moves else 0.0}
+
+
+def random_opening(board, plies, rng):
+    color = WHITE
+    for _ in range(plies):
+        moves = board.get_moves(color)
+        if not moves:
+            break
+        board.make_move(rng.choice(moves))
+        color = opponent(color)
+    return color
+
+
+def play_game(white_config, red_config, seed, opening_plies=OPENING_PLIES, max_plies=MAX_PLIES):
+    board = Board()
+    color = random_opening(board, opening_plies, random.Random(seed))
+    players = {WHITE: Player(white_config), RED: Player(red_config)}
+    start = Position.from_board(board, color)
+    played = []
+    result, reason = None, None
+    plies = 0
+    while result is None:
+        # no legal moves, threefold repetition or no progress ends the game
+        outcome = board.result(color)
+        if outcome is not None:
+            result, reason = outcome
+        elif plies >= max_plies:
+            result, reason = 'draw', 'move_limit'
+        else:
+            move = players[color].choose(board, color)
+            played.append(encode_move(board, color, move))
+            board.make_move(move)
+            color = opponent(color)
+            plies += 1
+    return {'seed': seed, 'white': white_config['name'], 'red': red_config['name'],
+            'result': result, 'reason': reason, 'plies': plies,
+            'white_stats': players[WHITE].summary(), 'red_stats': players[RED].summary(),
+            'start': start, 'moves': played}
+
+
+def elo(wins, draws, losses):
+    # Elo difference of the first engine with a 95% confidence interval
+    games = wins + draws + losses
+    if not games:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+
+    def to_elo(p):
+        p = min(max(p, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / p - 1)
+
+    return to_elo(score), (to_elo(score + margin) - to_elo(score - margin)) / 2
+
+
+def run_tournament(first, second, games, out_path, workers=None, seed=0,
+                   opening_plies=OPENING_PLIES, max_plies=MAX_PLIES, record_path=None):
+    # Each opening is played twice with colours swapped; results are
+    # appended to out_path as JSON lines as soon as each game finishes, and
+    # the games themselves to the game log at record_path if given.
+    tally = {'wins': 0, 'draws': 0, 'losses': 0}
+    log = GameLog(record_path) if record_path else None
+    with open(out_path, 'a') as out, ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        futures = []
+        for game in range(games):
+            opening = seed + game // 2
+            if game % 2 == 0:
+                futures.append(pool.submit(play_game, first, second, opening, opening_plies, max_plies))
+            else:
+                futures.append(pool.submit(play_game, second, first, opening, opening_plies, max_plies))
+        for future in as_completed(futures):
+            record = future.result()
+            start, played = record.pop('start'), record.pop('moves')
+            if log is not None:
+                log.append(start, played, record['result'])
+            if record['result'] == 'draw':
+                tally['draws'] += 1
+            elif record[record['result']] == first['name']:
+                tally['wins'] += 1
+            else:
+                tally['losses'] += 1
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+
+        diff, margin = elo(tally['wins'], tally['draws'], tally['losses'])
+        summary = dict(tally, type='summary', first=first['name'], second=second['name'],
+                       elo=diff, elo_margin=margin)
+        out.write(json.dumps(summary) + '\n')
+    if log is not None:
+        log.close()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless engine-vs-engine tournament')
+    parser.add_argument('first', help='engine spec, e.g. algorithm=alpha_beta,depth=5,king=250')
+    parser.add_argument('second', help='engine spec, e.g. algorithm=minimax,depth=4')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='tournament.jsonl')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--opening-plies', type=int, default=OPENING_PLIES)
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES)
+    parser.add_argument('--record', help='append the games to this game log')
+    args = parser.parse_args()
+    first, second = parse_engine(args.first), parse_engine(args.second)
+    if first['name'] == second['name']:
+        first['name'] += ' (1)'
+        second['name'] += ' (2)'
+    summary = run_tournament(first, second, args.games, args.out, args.workers, args.seed,
+                             args.opening_plies, args.max_plies, args.record)
+    print('{first} vs {second}: +{wins} ={draws} -{losses}  Elo {elo:+.1f} +/- {elo_margin:.1f}'.format(**summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Rough cost of one slot: the key plus an entry tuple of
+# (depth, flag, score, move, generation) and the move tuple it points at.
+ENTRY_SIZE = 160
+
+
+class TranspositionTable:
+    # Scores are stored from the point of view of the side the search
+    # maximises for, so one table should only serve one engine colour.
+    def __init__(self, size_mb=16):
+        slots = 1
+        while slots * 2 * ENTRY_SIZE <= size_mb * 1024 * 1024:
+            slots *= 2
+        self.size = slots
+        self.mask = slots - 1
+        self.keys = [0] * slots
+        self.entries = [None] * slots
+        self.generation = 0
+        self.hits = self.misses = self.collisions = 0
+        self.stores = self.replacements = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.keys = [0] * self.size
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = self.misses = self.collisions = 0
+        self.stores = self.replacements = 0
+
+    def probe(self, key):
+        index = key & self.mask
+        if self.keys[index] == key and self.entries[index] is not None:
+            self.hits += 1
+            return self.entries[index]
+        if self.entries[index] is not None:
+            self.collisions += 1
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is not None and self.keys[index] != key:
+            # depth-preferred, but entries left over from older searches
+            # always give way
+            if entry[4] == self.generation and entry[0] > depth:
+                return
+            self.replacements += 1
+        self.keys[index] = key
+        self.entries[index] = (depth, flag, score, move, self.generation)
+        self.stores += 1
+
+    def usage(self):
+        used = sum(1 for entry in self.entries if entry is not None)
+        return used / self.size
+
+    def counters(self):
+        return {'size': self.size, 'hits': self.hits, 'misses': self.misses,
+                'collisions': self.collisions, 'stores': self.stores,
+                'replacements': self.replacements}
@@ -0,0 +1,144 @@
+import argparse
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from batch import LAYERS, encode, layer_tables
+from bitboard import SQUARES
+from evaluation import DEFAULT_WEIGHTS, Evaluation, load_weights, save_weights
+from gamedb import read_games
+from tournament import parse_engine, run_tournament
+
+# Texel-style tuning: every quiet position of a self-play game is labelled
+# with the game's result from white's point of view, and the weights are
+# fitted so that sigmoid(scale * score) predicts that label.
+
+# mobility is not a piece-square term, so it is left as it is
+TERMS = [term for term in DEFAULT_WEIGHTS if term != 'mobility']
+# the man stays at its value, so scores keep their units
+FIXED = ('man',)
+LABELS = {'white': 1.0, 'red': 0.0, 'draw': 0.5}
+# opening positions come from the random opening moves, not from play
+SKIP_PLIES = 8
+ITERATIONS = 1000
+RATE = 0.5
+
+
+def feature_table():
+    # (4 * 32, terms): the signed per-square contribution of each term at
+    # weight 1, laid out like batch.evaluate_batch's piece-square tables
+    columns = []
+    for term in TERMS:
+        unit = Evaluation({name: int(name == term) for name in DEFAULT_WEIGHTS})
+        columns.append(np.array(layer_tables(unit), dtype=np.float64).reshape(LAYERS * SQUARES))
+    return np.stack(columns, axis=1)
+
+
+def features(encoded):
+    # (N, terms) feature counts of encoded positions; score = features @ w
+    encoded = np.ascontiguousarray(encoded, dtype='<u4').reshape(-1, LAYERS)
+    bits = np.unpackbits(encoded.view(np.uint8), axis=1, bitorder='little')
+    return bits.astype(np.float64) @ feature_table()
+
+
+def load_positions(log_path, skip_plies=SKIP_PLIES):
+    # Streams the game log and keeps the quiet positions of finished games.
+    # Positions with a capture pending are skipped: their static score says
+    # little about the outcome.
+    rows, labels = [], []
+    for record in read_games(log_path):
+        if record.result not in LABELS:
+            continue
+        label = LABELS[record.result]
+        for ply, (position, move) in enumerate(record.replay()):
+            if ply < skip_plies:
+                continue
+            bits = position.bitboard()
+            if bits.has_captures(position.color):
+                continue
+            rows.append(encode(bits))
+            labels.append(label)
+    return np.array(rows, dtype=np.uint32).reshape(-1, LAYERS), np.array(labels)
+
+
+def loss(x, y, w, scale):
+    p = 1 / (1 + np.exp(-scale * (x @ w)))
+    p = np.clip(p, 1e-12, 1 - 1e-12)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+
+def fit_scale(x, y, w):
+    # The logistic scale that best fits the starting weights; kept fixed
+    # afterwards, it ties score units to winning chances.
+    scales = np.logspace(-4, -1, 61)
+    best = min(scales, key=lambda scale: loss(x, y, w, scale))
+    fine = np.linspace(best / 1.2, best * 1.2, 41)
+    return float(min(fine, key=lambda scale: loss(x, y, w, scale)))
+
+
+def fit(x, y, weights, iterations=ITERATIONS, rate=RATE, scale=None, log=None):
+    # Full-batch Adam on the logistic loss over all positions at once.
+    w = np.array([weights[term] for term in TERMS], dtype=np.float64)
+    free = np.array([term not in FIXED for term in TERMS], dtype=np.float64)
+    if scale is None:
+        scale = fit_scale(x, y, w)
+    m = np.zeros_like(w)
+    v = np.zeros_like(w)
+    beta1, beta2 = 0.9, 0.999
+    for step in range(1, iterations + 1):
+        p = 1 / (1 + np.exp(-scale * (x @ w)))
+        gradient = scale * (x.T @ (p - y)) / len(y) * free
+        m = beta1 * m + (1 - beta1) * gradient
+        v = beta2 * v + (1 - beta2) * gradient * gradient
+        w -= rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + 1e-12)
+        if log and step % 100 == 0:
+            log('step {:5d}  loss {:.6f}'.format(step, loss(x, y, w, scale)))
+    return dict(weights, **{term: int(round(value)) for term, value in zip(TERMS, w)}), scale
+
+
+def self_play(games, log_path, depth=2, workers=None, seed=0):
+    # Same engine on both sides; the tournament's random openings give the
+    # games their variety and the games go straight into the game log.
+    engine = parse_engine('depth={},quiescence=1'.format(depth))
+    first, second = dict(engine, name='white'), dict(engine, name='red')
+    run_tournament(first, second, games, os.devnull, workers, seed, record_path=log_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit evaluation weights to self-play results')
+    parser.add_argument('--games', type=int, default=0, help='self-play games to add to the log first')
+    parser.add_argument('--depth', type=int, default=2, help='search depth for self-play')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--log', default='selfplay.log', help='game log to read (and extend)')
+    parser.add_argument('--start', help='weights file to start from instead of the defaults')
+    parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--skip-plies', type=int, default=SKIP_PLIES)
+    parser.add_argument('--out', default='weights.json')
+    args = parser.parse_args()
+    if np is None:
+        parser.error('numpy is required for tuning')
+
+    started = time.perf_counter()
+    if args.games:
+        self_play(args.games, args.log, args.depth, args.workers, args.seed)
+        print('self-play: {} games in {:.1f}s'.format(args.games, time.perf_counter() - started))
+    encoded, labels = load_positions(args.log, args.skip_plies)
+    x = features(encoded)
+    print('{} positions loaded in {:.1f}s'.format(len(labels), time.perf_counter() - started))
+
+    start = load_weights(args.start).weights if args.start else dict(DEFAULT_WEIGHTS)
+    weights, scale = fit(x, labels, start, args.iterations, log=print)
+    before = loss(x, labels, np.array([start[term] for term in TERMS], dtype=np.float64), scale)
+    after = loss(x, labels, np.array([weights[term] for term in TERMS], dtype=np.float64), scale)
+    save_weights(args.out, weights, positions=len(labels), scale=scale, loss_before=before, loss_after=after,
+                 log=args.log)
+    print('loss {:.6f} -> {:.6f}, weights {} written to {}'.format(before, after, weights, args.out))
+
+
+if __name__ == '__main__':
+    main()
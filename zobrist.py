@@ -0,0 +1,33 @@
+import random
+
+from constants import WHITE, RED
+from bitboard import SQUARES, squares
+
+# Fixed seed so keys (and anything stored under them) are stable across runs.
+_rng = random.Random(0x636865636b657273)
+
+WHITE_MAN = [_rng.getrandbits(64) for _ in range(SQUARES)]
+RED_MAN = [_rng.getrandbits(64) for _ in range(SQUARES)]
+WHITE_KING = [_rng.getrandbits(64) for _ in range(SQUARES)]
+RED_KING = [_rng.getrandbits(64) for _ in range(SQUARES)]
+
+SIDE = {WHITE: 0, RED: _rng.getrandbits(64)}
+
+
+def piece_keys(color, king):
+    if color == WHITE:
+        return WHITE_KING if king else WHITE_MAN
+    return RED_KING if king else RED_MAN
+
+
+def hash_bitboard(bits):
+    key = 0
+    for sq in squares(bits.white & ~bits.kings):
+        key ^= WHITE_MAN[sq]
+    for sq in squares(bits.red & ~bits.kings):
+        key ^= RED_MAN[sq]
+    for sq in squares(bits.white & bits.kings):
+        key ^= WHITE_KING[sq]
+    for sq in squares(bits.red & bits.kings):
+        key ^= RED_KING[sq]
+    return key